@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .sqlite import configure_connection
+        connection_created.connect(configure_connection)
+        if settings.TEMPLATES_CACHED:
+            from .template_backend import precompile_templates
+            precompile_templates()
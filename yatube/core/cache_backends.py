@@ -0,0 +1,259 @@
+# core/cache_backends.py
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Значение в кэше хранится как (value, fresh_until, tag): после
+# fresh_until или при смене tag оно устаревает, но ещё STALE_TIMEOUT
+# секунд может отдаваться, пока его пересчитывает кто-то другой
+VALUE, FRESH_UNTIL, TAG = range(3)
+
+# Django создаёт экземпляр бэкенда на каждый поток, поэтому локальный
+# кэш и список пересчитываемых ключей общие на процесс, как в LocMemCache
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class LocalLRU:
+    """Ограниченный по размеру кэш процесса, безопасный для потоков.
+
+    Значения хранятся сериализованными, чтобы вызывающий код
+    не мог испортить общую копию, как и в LocMemCache.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            data, deadline = entry
+            if deadline < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def set(self, key, envelope):
+        data = pickle.dumps(envelope, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (data, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TwoTierCache(BaseCache):
+    """Кэш процесса (LRU) перед общим кэшем другого алиаса CACHES.
+
+    Локальная копия живёт не дольше LOCAL_TIMEOUT секунд, так что
+    изменения из других процессов видны с такой задержкой. Метод
+    get_or_build() пересчитывает значение в одном месте (single-flight)
+    и отдаёт остальным устаревшее значение, пока идёт пересчёт.
+
+    LOCATION — имя локального кэша в процессе. OPTIONS: SHARED (алиас
+    общего кэша), MAX_ENTRIES, LOCAL_TIMEOUT, STALE_TIMEOUT,
+    LOCK_TIMEOUT, LOCK_WAIT.
+
+    Ограничения. incr() — чтение и запись без блокировки, поэтому при
+    одновременных вызовах прибавки теряются: годится для статистики,
+    но не для точных счётчиков. Блокировка пересчёта между процессами
+    держится на add() общего кэша; у FileBasedCache (CACHE_DIR) add()
+    не атомарен, так что изредка значение пересчитают два процесса.
+    Строгий single-flight между процессами требует общего кэша
+    с атомарным add(), например Memcached или Redis.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.stale_timeout = options.get('STALE_TIMEOUT', 60)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 30)
+        self.lock_wait = options.get('LOCK_WAIT', 5)
+        with _tiers_lock:
+            if location not in _tiers:
+                _tiers[location] = (
+                    LocalLRU(
+                        self._max_entries, options.get('LOCAL_TIMEOUT', 5)),
+                    set(),
+                    threading.Lock(),
+                )
+        self.local, self.building, self.building_lock = _tiers[location]
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    # Хранение конвертов
+
+    def _load(self, key, local=True):
+        envelope = self.local.get(key) if local else None
+        if envelope is None:
+            envelope = self.shared.get(key)
+            if envelope is not None:
+                self.local.set(key, envelope)
+        return envelope
+
+    def _store(self, key, value, timeout, tag=None, add=False):
+        fresh_until = self.get_backend_timeout(timeout)
+        envelope = (value, fresh_until, tag)
+        shared_timeout = None
+        if fresh_until is not None:
+            shared_timeout = max(fresh_until - time.time(), 0)
+            if not shared_timeout:
+                self.local.delete(key)
+                self.shared.delete(key)
+                return False
+            shared_timeout += self.stale_timeout
+        if add:
+            if not self.shared.add(key, envelope, shared_timeout):
+                return False
+        else:
+            self.shared.set(key, envelope, shared_timeout)
+        self.local.set(key, envelope)
+        return True
+
+    @staticmethod
+    def _is_fresh(envelope, tag=None):
+        if envelope[TAG] != tag:
+            return False
+        fresh_until = envelope[FRESH_UNTIL]
+        return fresh_until is None or fresh_until > time.time()
+
+    # Интерфейс BaseCache
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        envelope = self._load(key)
+        if envelope is None or not self._is_fresh(envelope, envelope[TAG]):
+            return default
+        return envelope[VALUE]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._store(key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        envelope = self._load(key, local=False)
+        if envelope is not None and self._is_fresh(envelope, envelope[TAG]):
+            return False
+        if envelope is not None:
+            # Устаревший конверт не должен мешать add()
+            self.shared.delete(key)
+        return self._store(key, value, timeout, add=True)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        envelope = self._load(key, local=False)
+        if envelope is None:
+            return False
+        return self._store(key, envelope[VALUE], timeout, envelope[TAG])
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        envelope = self._load(key, local=False)
+        if envelope is None or not self._is_fresh(envelope, envelope[TAG]):
+            raise ValueError(f"Key '{key}' not found")
+        # Сохраняем прежний срок жизни, а не таймаут по умолчанию
+        fresh_until = envelope[FRESH_UNTIL]
+        timeout = None if fresh_until is None else fresh_until - time.time()
+        value = envelope[VALUE] + delta
+        self._store(key, value, timeout, envelope[TAG])
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version=version) is not self
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    # Пересчёт с защитой от лавины
+
+    def _acquire(self, key):
+        with self.building_lock:
+            if key in self.building:
+                return False
+            self.building.add(key)
+        # Между процессами блокировкой служит add() в общем кэше
+        if self.shared.add(f'{key}:lock', 1, self.lock_timeout):
+            return True
+        with self.building_lock:
+            self.building.discard(key)
+        return False
+
+    def _release(self, key):
+        self.shared.delete(f'{key}:lock')
+        with self.building_lock:
+            self.building.discard(key)
+
+    def get_or_build(self, key, build, timeout=DEFAULT_TIMEOUT, tag=None,
+                     version=None):
+        """Значение из кэша или результат build(), посчитанный один раз.
+
+        ``tag`` — версия ключа: значение с другим tag считается
+        устаревшим, как и просроченное. Устаревшее значение отдаётся,
+        пока его пересчитывает другой поток или процесс; если значения
+        нет совсем, остальные ждут до LOCK_WAIT секунд. Если build()
+        вернул None, ничего не сохраняется.
+        """
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        envelope = self._load(key)
+        if envelope is not None and self._is_fresh(envelope, tag):
+            return envelope[VALUE]
+        if self._acquire(key):
+            try:
+                # Пока ждали блокировку, значение могли уже пересчитать
+                current = self._load(key, local=False)
+                if current is not None and self._is_fresh(current, tag):
+                    return current[VALUE]
+                value = build()
+                if value is not None:
+                    self._store(key, value, timeout, tag)
+                return value
+            finally:
+                self._release(key)
+        if envelope is not None:
+            return envelope[VALUE]
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            current = self._load(key, local=False)
+            if current is not None and self._is_fresh(current, tag):
+                return current[VALUE]
+            # Блокировку сняли, а значения нет: build() упал или вернул
+            # None (например, 404), и ждать больше нечего
+            if self.shared.get(f'{key}:lock') is None:
+                break
+        # Пересчёт затянулся или не удался: считаем сами, но не сохраняем
+        return build()
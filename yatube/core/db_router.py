@@ -0,0 +1,71 @@
+# core/db_router.py
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_pin'
+
+_state = threading.local()
+
+
+def use_replica(enabled):
+    """Разрешает или запрещает чтение с реплик в текущем потоке."""
+    _state.replica = enabled
+
+
+@contextmanager
+def primary_reads():
+    """Временно читает с основной базы, даже если реплики разрешены."""
+    previous = getattr(_state, 'replica', False)
+    _state.replica = False
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def has_written():
+    return getattr(_state, 'wrote', False)
+
+
+def reset_state():
+    _state.replica = False
+    _state.wrote = False
+
+
+class ReplicaRouter:
+    """Отправляет чтение лент и постов на реплики, а запись — на основную.
+
+    С реплик читают только view из settings.REPLICA_VIEWS, и только
+    пока ReplicaMiddleware не закрепил пользователя за основной базой,
+    и только модели из REPLICA_APPS (сессии всегда читаются с основной).
+    После первой записи в запросе чтение тоже идёт с основной базы.
+    Всё, что попадает в кэш под текущей версией области, строится
+    внутри primary_reads(): отставшая реплика иначе закэшировала бы
+    старые данные под новой версией.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if (not replicas or not getattr(_state, 'replica', False)
+                or has_written()
+                or model._meta.app_label not in settings.REPLICA_APPS):
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными от основной базы
+        return db == PRIMARY
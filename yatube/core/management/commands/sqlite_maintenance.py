@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.sqlite import run_maintenance
+
+
+class Command(BaseCommand):
+    help = (
+        'Обслуживает базу SQLite: PRAGMA optimize, ANALYZE '
+        'и контрольная точка WAL; можно запускать по крону или в цикле'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Пересобрать статистику планировщика целиком',
+        )
+        parser.add_argument(
+            '--loop', type=int, metavar='SECONDS',
+            help='Повторять раз в столько секунд, пока не остановят',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            self.stdout.write('База не SQLite, обслуживать нечего')
+            return
+        while True:
+            started = time.monotonic()
+            for line in run_maintenance(connection, options['analyze']):
+                self.stdout.write(line)
+            self.stdout.write(
+                f'Готово за {(time.monotonic() - started) * 1000:.0f} мс')
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
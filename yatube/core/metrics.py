@@ -0,0 +1,194 @@
+# core/metrics.py
+import glob
+import json
+import os
+import threading
+import time
+
+# Границы корзин гистограмм (верхние, включительно)
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(8))
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+HELP = {
+    'yatube_http_requests_total': 'Число запросов по имени URL',
+    'yatube_http_request_duration_seconds': 'Время ответа',
+    'yatube_http_response_size_bytes': 'Размер ответа',
+    'yatube_db_queries_per_request': 'SQL-запросов на один запрос',
+    'yatube_page_cache_requests_total': 'Обращения к кэшу страниц',
+    'yatube_page_cache_hit_ratio': 'Доля попаданий в кэш страниц',
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+    """Счётчики и гистограммы процесса, безопасные для потоков.
+
+    Значения хранятся в памяти. В режиме общих файлов каждый процесс
+    периодически сбрасывает снимок в ``<dir>/<pid>.json``, а страница
+    метрик складывает снимки всех процессов.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.flushed = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, _labels_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, _labels_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    'buckets': list(buckets),
+                    'counts': [0] * (len(buckets) + 1),
+                    'sum': 0,
+                }
+            position = len(buckets)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    position = index
+                    break
+            histogram['counts'][position] += 1
+            histogram['sum'] += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [
+                    [name, list(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, list(labels), dict(
+                        histogram, counts=list(histogram['counts']))]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def flush(self, directory):
+        """Записывает снимок процесса в общий каталог."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as snapshot:
+            json.dump(self.snapshot(), snapshot)
+        os.replace(tmp, path)
+        self.flushed = time.monotonic()
+
+    def maybe_flush(self, directory, interval):
+        if time.monotonic() - self.flushed >= interval:
+            self.flush(directory)
+
+
+registry = Registry()
+
+
+def merge(snapshots):
+    """Складывает снимки нескольких процессов в один."""
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, histogram in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.get(key)
+            if total is None:
+                histograms[key] = dict(
+                    histogram, counts=list(histogram['counts']))
+                continue
+            total['counts'] = [
+                a + b for a, b in zip(total['counts'], histogram['counts'])]
+            total['sum'] += histogram['sum']
+    return counters, histograms
+
+
+def collect(directory=None):
+    """Снимок этого процесса или, в режиме файлов, всех процессов."""
+    if directory is None:
+        return merge([registry.snapshot()])
+    registry.flush(directory)
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(path) as snapshot:
+                snapshots.append(json.load(snapshot))
+        except (OSError, ValueError):
+            # Файл мог исчезнуть или быть недописан
+            continue
+    return merge(snapshots)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(
+            key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in pairs
+    )
+    return '{' + body + '}'
+
+
+def _hit_ratios(counters):
+    totals = {}
+    for (name, labels), value in counters.items():
+        if name != 'yatube_page_cache_requests_total':
+            continue
+        labels = dict(labels)
+        hits, count = totals.get(labels['view'], (0, 0))
+        if labels['result'] == 'hit':
+            hits += value
+        totals[labels['view']] = (hits, count + value)
+    return {
+        (('view', view),): hits / count
+        for view, (hits, count) in totals.items() if count
+    }
+
+
+def render(counters, histograms):
+    """Текст в формате экспозиции Prometheus."""
+    lines = []
+    families = {}
+    for (name, labels), value in sorted(counters.items()):
+        families.setdefault((name, 'counter'), []).append(
+            f'{name}{_format_labels(labels)} {value}')
+    for labels, ratio in sorted(_hit_ratios(counters).items()):
+        name = 'yatube_page_cache_hit_ratio'
+        families.setdefault((name, 'gauge'), []).append(
+            f'{name}{_format_labels(labels)} {ratio:.4f}')
+    for (name, labels), histogram in sorted(histograms.items()):
+        samples = families.setdefault((name, 'histogram'), [])
+        cumulative = 0
+        bounds = histogram['buckets'] + ['+Inf']
+        for bound, count in zip(bounds, histogram['counts']):
+            cumulative += count
+            samples.append(
+                f'{name}_bucket'
+                f'{_format_labels(labels, [("le", bound)])} {cumulative}')
+        samples.append(f'{name}_sum{_format_labels(labels)} '
+                       f'{histogram["sum"]}')
+        samples.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    for (name, kind), samples in families.items():
+        lines.append(f'# HELP {name} {HELP.get(name, name)}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
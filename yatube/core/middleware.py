@@ -0,0 +1,290 @@
+# core/middleware.py
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import reverse
+
+from . import db_router, metrics
+from .profiling import profile_request
+from .slow_queries import SlowQueryRecorder
+
+logger = logging.getLogger(__name__)
+timing_logger = logging.getLogger('core.timing')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """Обёртка выполнения запросов, которая считает их количество."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryTimer(QueryCounter):
+    """Считает запросы и суммарное время, проведённое в базе."""
+
+    def __init__(self):
+        super().__init__()
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return super().__call__(execute, sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+
+
+class RequestTiming:
+    """Замеры одного запроса: секунды по метрикам Server-Timing."""
+
+    def __init__(self):
+        self.durations = {}
+        self.queries = 0
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def header(self):
+        # Заголовок должен быть в ASCII, поэтому описание только у SQL
+        parts = []
+        for name, seconds in self.durations.items():
+            part = f'{name};dur={seconds * 1000:.1f}'
+            if name == 'db':
+                part += f';desc="{self.queries} queries"'
+            parts.append(part)
+        return ', '.join(parts)
+
+    def as_dict(self):
+        data = {
+            f'{name}_ms': round(seconds * 1000, 2)
+            for name, seconds in self.durations.items()
+        }
+        data['queries'] = self.queries
+        return data
+
+
+class ServerTimingMiddleware:
+    """Замеряет время запроса по частям и отдаёт его в Server-Timing.
+
+    Время SQL и число запросов считаются обёрткой выполнения,
+    рендеринг шаблонов и контекст-процессоры — бэкендом
+    core.template_backend.DjangoTemplates. Запросы из шаблона входят
+    и в db, и в tpl. Замеряется только доля запросов
+    SERVER_TIMING_SAMPLE_RATE, остальные проходят без накладных расходов.
+    Для каждого замера в лог core.timing пишется строка JSON.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+        timing = request.server_timing = RequestTiming()
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        timing.add('db', timer.duration)
+        timing.add('total', time.perf_counter() - start)
+        timing.queries = timer.count
+        response['Server-Timing'] = timing.header()
+        self.log(request, response, timing)
+        return response
+
+    def log(self, request, response, timing):
+        match = request.resolver_match
+        record = {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **timing.as_dict(),
+        }
+        timing_logger.info(json.dumps(record, ensure_ascii=False))
+
+
+class MetricsMiddleware:
+    """Собирает метрики запросов для страницы /metrics.
+
+    Учитываются только view из пространств имён
+    settings.METRICS_NAMESPACES; метка view — имя URL вида
+    'posts:index_p'. Считаются запросы, время ответа, размер ответа,
+    число SQL-запросов и попадания в кэш страниц (X-Page-Cache).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is not None and match.namespace in (
+                settings.METRICS_NAMESPACES):
+            self.record(request, response, match.view_name,
+                        time.perf_counter() - start, counter.count)
+        directory = settings.METRICS_MULTIPROCESS_DIR
+        if directory:
+            metrics.registry.maybe_flush(
+                directory, settings.METRICS_FLUSH_INTERVAL)
+        return response
+
+    def record(self, request, response, view, duration, queries):
+        registry = metrics.registry
+        registry.inc('yatube_http_requests_total', {
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+        })
+        labels = {'view': view}
+        registry.observe('yatube_http_request_duration_seconds', labels,
+                         duration, metrics.LATENCY_BUCKETS)
+        registry.observe('yatube_db_queries_per_request', labels,
+                         queries, metrics.QUERY_BUCKETS)
+        # Размер потокового ответа заранее неизвестен
+        if not response.streaming:
+            registry.observe('yatube_http_response_size_bytes', labels,
+                             len(response.content), metrics.SIZE_BUCKETS)
+        page_cache = response.get('X-Page-Cache')
+        if page_cache:
+            registry.inc('yatube_page_cache_requests_total', {
+                'view': view, 'result': page_cache.lower()})
+
+
+class ReplicaMiddleware:
+    """Включает чтение с реплик для view из REPLICA_VIEWS.
+
+    После записи пользователь на REPLICA_PIN_SECONDS закрепляется за
+    основной базой через cookie, чтобы сразу видеть свой пост, даже
+    если реплика ещё не догнала основную базу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db_router.reset_state()
+        try:
+            response = self.get_response(request)
+            if db_router.has_written():
+                response.set_cookie(
+                    db_router.PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_PIN_SECONDS, httponly=True)
+            return response
+        finally:
+            db_router.reset_state()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        db_router.use_replica(
+            request.method in ('GET', 'HEAD')
+            and db_router.PIN_COOKIE not in request.COOKIES
+            and request.resolver_match.view_name in settings.REPLICA_VIEWS
+        )
+
+
+class SlowQueryMiddleware:
+    """Пишет в лог запросы дольше SLOW_QUERY_THRESHOLD_MS.
+
+    Для каждого такого запроса сохраняются view, место в коде,
+    параметры и план; сводка — на странице /debug/slow-queries/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.SLOW_QUERY_THRESHOLD_MS is None:
+            return self.get_response(request)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    SlowQueryRecorder(request, connection.alias)))
+            return self.get_response(request)
+
+
+class QueryBudgetMiddleware:
+    """Следит, чтобы view не делало больше запросов, чем ей положено.
+
+    Лимиты задаются в settings.QUERY_BUDGETS по имени URL
+    (например, 'posts:index_p'). Превышение пишется в лог, а при
+    QUERY_BUDGET_RAISE поднимается исключение — так N+1 сразу
+    роняет тесты.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGET_ENFORCE:
+            return self.get_response(request)
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        self.check_budget(request, counter.count)
+        return response
+
+    def check_budget(self, request, count):
+        match = request.resolver_match
+        if match is None:
+            return
+        budget = settings.QUERY_BUDGETS.get(match.view_name)
+        if budget is None or count <= budget:
+            return
+        message = (
+            f'{match.view_name}: {count} SQL-запросов '
+            f'при лимите {budget} ({request.get_full_path()})'
+        )
+        if settings.QUERY_BUDGET_RAISE:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class ProfilerMiddleware:
+    """Профилирует один запрос персонала с параметром PROFILER_PARAM.
+
+    Например, ``/group/cats/?_profile=1``. Ответ отдаётся как обычно,
+    а ссылка на сохранённый отчёт приходит в заголовке X-Profile-Report.
+    Без параметра middleware только проверяет строку запроса.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        param = settings.PROFILER_PARAM
+        if (param not in request.META.get('QUERY_STRING', '')
+                or param not in request.GET
+                or not request.user.is_staff):
+            return self.get_response(request)
+        # Списки в админке считают незнакомые параметры фильтрами
+        request.GET = request.GET.copy()
+        del request.GET[param]
+        response, name = profile_request(self.get_response, request)
+        response['X-Profile-Report'] = reverse(
+            'profile_report', args=[name])
+        return response
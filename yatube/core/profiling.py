@@ -0,0 +1,111 @@
+# core/profiling.py
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .sql import QueryLog, explain
+
+REPORT_NAME = re.compile(r'^[\w-]+\.(txt|prof)$')
+
+
+def report_path(name):
+    """Путь к отчёту по имени файла или None, если имя подозрительное."""
+    if not REPORT_NAME.match(name):
+        return None
+    return os.path.join(settings.PROFILER_DIR, name)
+
+
+def list_reports():
+    """Текстовые отчёты, новые первыми."""
+    try:
+        names = os.listdir(settings.PROFILER_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (name for name in names if name.endswith('.txt')), reverse=True)
+
+
+def profile_request(get_response, request):
+    """Выполняет запрос под cProfile, tracemalloc и журналом SQL.
+
+    Отчёт (текст и дамп pstats) сохраняется в PROFILER_DIR;
+    возвращаются ответ и имя текстового отчёта.
+    """
+    logs = [QueryLog(connection.alias) for connection in connections.all()]
+    profiler = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection, log in zip(connections.all(), logs):
+                stack.enter_context(connection.execute_wrapper(log))
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+        memory = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    match = request.resolver_match
+    view = match.view_name.replace(':', '-') if match else 'unresolved'
+    name = (
+        f'{timezone.now():%Y%m%d-%H%M%S}-{view}-{uuid.uuid4().hex[:6]}')
+    profiler.dump_stats(os.path.join(settings.PROFILER_DIR, f'{name}.prof'))
+    with open(os.path.join(settings.PROFILER_DIR, f'{name}.txt'), 'w',
+              encoding='utf-8') as report:
+        report.write(render_report(
+            request, response, duration, profiler, logs, memory))
+    return response, f'{name}.txt'
+
+
+def render_report(request, response, duration, profiler, logs, memory):
+    top = settings.PROFILER_TOP
+    out = io.StringIO()
+    queries = sum(len(log.queries) for log in logs)
+    out.write(
+        f'{request.method} {request.get_full_path()}\n'
+        f'Пользователь: {request.user}\n'
+        f'Статус: {response.status_code}\n'
+        f'Время: {duration * 1000:.1f} мс, SQL-запросов: {queries}\n\n'
+    )
+
+    out.write('== cProfile (по накопленному времени) ==\n')
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats('cumulative').print_stats(top)
+
+    out.write('\n== SQL ==\n')
+    for log in logs:
+        connection = connections[log.alias]
+        for number, query in enumerate(log.queries, 1):
+            out.write(
+                f'\n#{number} [{log.alias}] {query["duration"] * 1000:.2f} мс'
+                f'\n{query["sql"]}\nПараметры: {query["params"]}\n'
+            )
+            if query['many']:
+                continue
+            for line in explain(connection, query['sql'], query['params']):
+                out.write(f'    {line}\n')
+
+    out.write(f'\n== tracemalloc, топ-{top} ==\n')
+    for stat in memory.statistics('lineno')[:top]:
+        out.write(f'{stat}\n')
+    return out.getvalue()
@@ -0,0 +1,172 @@
+# core/slow_queries.py
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .sql import explain
+
+logger = logging.getLogger('core.slow_queries')
+_handler_lock = threading.Lock()
+_state = threading.local()
+
+CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class SlowQueryHandler(RotatingFileHandler):
+    """Файл журнала, который подключает сам модуль, а не LOGGING."""
+
+
+def _ensure_handler():
+    # Файловый обработчик подключаем при первой записи: каталог логов
+    # может появиться уже после загрузки настроек
+    path = os.path.abspath(settings.SLOW_QUERY_LOG_FILE)
+    with _handler_lock:
+        # Чужие обработчики (например, из LOGGING) не трогаем, а свой
+        # заменяем, если путь в настройках поменялся
+        for handler in list(logger.handlers):
+            if not isinstance(handler, SlowQueryHandler):
+                continue
+            if handler.baseFilename == path:
+                return
+            logger.removeHandler(handler)
+            handler.close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = SlowQueryHandler(
+            path, maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUPS, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def query_origin():
+    """Ближайший к запросу кадр кода проекта: 'posts/views.py:profile'."""
+    base = os.path.abspath(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (not filename.startswith(base + os.sep)
+                or filename.startswith(CORE_DIR + os.sep)
+                or 'site-packages' in filename):
+            continue
+        return (
+            f'{os.path.relpath(filename, base)}:{frame.name}',
+            frame.lineno,
+        )
+    return None, None
+
+
+def query_shape(sql):
+    """Запрос без значений: одинаковые по форме запросы совпадают."""
+    shape = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    shape = re.sub(r'\b\d+(\.\d+)?\b', '?', shape)
+    shape = shape.replace('%s', '?')
+    shape = re.sub(r'IN \(\?(?:, \?)*\)', 'IN (...)', shape)
+    return re.sub(r'\s+', ' ', shape).strip()
+
+
+class SlowQueryRecorder:
+    """Обёртка выполнения запросов, которая пишет медленные в лог."""
+
+    def __init__(self, request, alias):
+        self.request = request
+        self.alias = alias
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            if (duration >= settings.SLOW_QUERY_THRESHOLD_MS
+                    and not getattr(_state, 'explaining', False)):
+                self.record(sql, params, many, duration)
+
+    def record(self, sql, params, many, duration):
+        match = self.request.resolver_match
+        origin, line = query_origin()
+        plan = []
+        if not many:
+            # EXPLAIN идёт через ту же обёртку, не записываем его самого
+            _state.explaining = True
+            try:
+                plan = explain(connections[self.alias], sql, params)
+            finally:
+                _state.explaining = False
+        _ensure_handler()
+        logger.info(json.dumps({
+            'time': timezone.now().isoformat(),
+            'duration_ms': round(duration, 3),
+            'view': match.view_name if match else None,
+            'path': self.request.path,
+            'origin': origin,
+            'line': line,
+            'alias': self.alias,
+            'sql': sql,
+            'params': (
+                [] if many else [str(value) for value in params or ()][:50]),
+            'plan': plan,
+        }, ensure_ascii=False))
+
+
+def read_log():
+    """Записи из лога и его ротированных копий, старые первыми."""
+    path = settings.SLOW_QUERY_LOG_FILE
+    paths = [
+        f'{path}.{number}'
+        for number in range(settings.SLOW_QUERY_LOG_BACKUPS, 0, -1)
+    ] + [path]
+    for name in paths:
+        try:
+            with open(name, encoding='utf-8') as log:
+                for line in log:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+def worst_shapes(limit=50):
+    """Формы запросов, отсортированные по суммарному времени."""
+    shapes = {}
+    for entry in read_log():
+        shape = query_shape(entry['sql'])
+        item = shapes.get(shape)
+        if item is None:
+            item = shapes[shape] = {
+                'shape': shape,
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'views': set(),
+                'origins': set(),
+            }
+        item['count'] += 1
+        item['total_ms'] += entry['duration_ms']
+        if entry['duration_ms'] >= item['max_ms']:
+            # Для самого долгого вызова показываем параметры и план
+            item['max_ms'] = entry['duration_ms']
+            item['params'] = entry['params']
+            item['plan'] = entry['plan']
+        if entry['view']:
+            item['views'].add(entry['view'])
+        if entry['origin']:
+            item['origins'].add(entry['origin'])
+    items = sorted(
+        shapes.values(), key=lambda item: item['total_ms'], reverse=True)
+    for item in items[:limit]:
+        item['mean_ms'] = item['total_ms'] / item['count']
+        item['views'] = sorted(item['views'])
+        item['origins'] = sorted(item['origins'])
+    return items[:limit]
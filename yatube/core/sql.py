@@ -0,0 +1,42 @@
+# core/sql.py
+import time
+
+from django.db import DatabaseError
+
+
+class QueryLog:
+    """Обёртка выполнения запросов, которая запоминает каждый запрос."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': params,
+                'many': many,
+                'duration': time.perf_counter() - start,
+            })
+
+
+def explain(connection, sql, params):
+    """План запроса строками текста; для не-SELECT — пустой список."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return []
+    prefix = (
+        'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN')
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError as error:
+        return [f'EXPLAIN не удался: {error}']
+    if connection.vendor == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [' '.join(str(value) for value in row) for row in rows]
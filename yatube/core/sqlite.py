@@ -0,0 +1,112 @@
+# core/sqlite.py
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+
+logger = logging.getLogger(__name__)
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def backoff_delays(attempts=None, base=None):
+    """Паузы между попытками: экспонента с разбросом."""
+    attempts = settings.SQLITE_LOCK_RETRIES if attempts is None else attempts
+    base = settings.SQLITE_LOCK_BACKOFF if base is None else base
+    for attempt in range(attempts):
+        yield base * 2 ** attempt * random.uniform(0.5, 1.5)
+
+
+def retry_on_lock(func):
+    """Повторяет функцию целиком, если база занята другим писателем.
+
+    Подходит для транзакций: откат и повтор всего блока безопасны,
+    в отличие от повтора одного запроса внутри транзакции.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for delay in backoff_delays():
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if not is_lock_error(error):
+                    raise
+                logger.warning('%s: база занята, повтор через %.3f с',
+                               func.__qualname__, delay)
+                time.sleep(delay)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+class LockRetry:
+    """Обёртка выполнения запросов, повторяющая запрос при блокировке.
+
+    Повторяются только запросы вне transaction.atomic: в автокоммите
+    каждый запрос — отдельная транзакция, и повтор ничего не нарушит.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.connection.in_atomic_block:
+            return execute(sql, params, many, context)
+        for delay in backoff_delays():
+            try:
+                return execute(sql, params, many, context)
+            except OperationalError as error:
+                if not is_lock_error(error):
+                    raise
+                logger.warning('База занята, повтор через %.3f с: %s',
+                               delay, sql[:200])
+                time.sleep(delay)
+        return execute(sql, params, many, context)
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение SQLite в боевом режиме.
+
+    Подключается к сигналу connection_created. WAL позволяет читать,
+    пока идёт запись, а busy_timeout — ждать блокировку, а не падать.
+    """
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRODUCTION:
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+    # Ставим первой: обёртки из execute_wrapper() снимаются с конца
+    # списка, и соединение может открыться внутри такой обёртки
+    if not any(isinstance(wrapper, LockRetry)
+               for wrapper in connection.execute_wrappers):
+        connection.execute_wrappers.insert(0, LockRetry(connection))
+
+
+def run_maintenance(connection, analyze=False):
+    """Обслуживание базы: статистика планировщика и сброс WAL.
+
+    Возвращает список строк для отчёта.
+    """
+    report = []
+    with connection.cursor() as cursor:
+        if analyze:
+            cursor.execute('ANALYZE')
+            report.append('ANALYZE выполнен')
+        cursor.execute('PRAGMA optimize')
+        report.append('PRAGMA optimize выполнен')
+        cursor.execute('PRAGMA journal_mode')
+        mode = cursor.fetchone()[0]
+        if mode == 'wal':
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            busy, log, checkpointed = cursor.fetchone()
+            report.append(
+                f'Контрольная точка WAL: страниц {checkpointed}/{log}'
+                + (' (база была занята)' if busy else ''))
+        else:
+            report.append(f'Журнал {mode}, контрольная точка не нужна')
+    return report
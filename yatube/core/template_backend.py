@@ -0,0 +1,114 @@
+# core/template_backend.py
+import functools
+import logging
+import os
+import time
+
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.backends import django as django_backend
+from django.template.loaders.cached import Loader as CachedLoader
+
+logger = logging.getLogger(__name__)
+
+
+def timed_processor(processor):
+    """Контекст-процессор, время которого попадает в замер запроса."""
+    @functools.wraps(processor)
+    def wrapper(request):
+        timing = getattr(request, 'server_timing', None)
+        if timing is None:
+            return processor(request)
+        start = time.perf_counter()
+        try:
+            return processor(request)
+        finally:
+            timing.add('ctx', time.perf_counter() - start)
+    return wrapper
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        timing = getattr(request, 'server_timing', None)
+        if timing is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.add('tpl', time.perf_counter() - start)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Стандартный бэкенд шаблонов, который умеет замерять рендеринг.
+
+    Время пишется в ``request.server_timing``, если его завёл
+    ServerTimingMiddleware; без него рендеринг идёт как обычно.
+    Контекст-процессоры замеряются отдельно от всего шаблона.
+    """
+
+    def __init__(self, params):
+        super().__init__(params)
+        engine = self.engine
+        engine.template_context_processors = tuple(
+            timed_processor(processor)
+            for processor in engine.template_context_processors
+        )
+
+    @property
+    def is_cached(self):
+        return any(isinstance(loader, CachedLoader)
+                   for loader in self.engine.template_loaders)
+
+    def template_names(self):
+        for directory in self.engine.dirs:
+            for root, dirs, files in os.walk(directory):
+                dirs.sort()
+                for filename in sorted(files):
+                    if filename.endswith('.html'):
+                        path = os.path.join(root, filename)
+                        yield os.path.relpath(path, directory).replace(
+                            os.sep, '/')
+
+    def precompile(self):
+        """Компилирует заранее все шаблоны из DIRS.
+
+        Имеет смысл только с кэширующим загрузчиком: без него шаблон
+        всё равно компилируется заново при каждом рендеринге.
+        Возвращает имена скомпилированных шаблонов.
+        """
+        compiled = []
+        for name in self.template_names():
+            try:
+                self.engine.get_template(name)
+            except TemplateSyntaxError:
+                logger.exception('Шаблон %s не компилируется', name)
+            else:
+                compiled.append(name)
+        return compiled
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+def precompile_templates():
+    """Компилирует шаблоны всех движков с кэширующим загрузчиком.
+
+    Вызывается при старте процесса, чтобы первый запрос к каждой
+    странице не платил за разбор шаблонов.
+    """
+    from django.template import engines
+
+    start = time.perf_counter()
+    compiled = []
+    for engine in engines.all():
+        if isinstance(engine, DjangoTemplates) and engine.is_cached:
+            compiled.extend(engine.precompile())
+    logger.info('Скомпилировано шаблонов: %d за %.1f мс', len(compiled),
+                (time.perf_counter() - start) * 1000)
+    return compiled
@@ -0,0 +1,62 @@
+# core/views.py
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseForbidden)
+from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics as registry
+from .profiling import list_reports, report_path
+from .slow_queries import worst_shapes
+
+
+def has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and constant_time_compare(header, f'Bearer {token}')
+
+
+def metrics(request):
+    """Метрики Prometheus: для персонала, по токену и доверенным адресам."""
+    allowed = (
+        request.user.is_staff
+        or has_metrics_token(request)
+        or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    counters, histograms = registry.collect(
+        settings.METRICS_MULTIPROCESS_DIR or None)
+    return HttpResponse(
+        registry.render(counters, histograms),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+@staff_member_required
+def profile_reports(request):
+    """Список сохранённых отчётов профилировщика."""
+    return render(request, 'core/profile_reports.html', {
+        'reports': list_reports(),
+        'param': settings.PROFILER_PARAM,
+    })
+
+
+@staff_member_required
+def profile_report(request, name):
+    path = report_path(name)
+    if path is None or not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+
+
+@staff_member_required
+def slow_queries(request):
+    """Самые дорогие по суммарному времени формы медленных запросов."""
+    return render(request, 'core/slow_queries.html', {
+        'shapes': worst_shapes(),
+        'threshold': settings.SLOW_QUERY_THRESHOLD_MS,
+    })
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Group
+from .search import filter_by_search, search_available
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -14,6 +15,13 @@ class PostAdmin(admin.ModelAdmin):
     # Это свойство сработает для всех колонок: где пусто — там будет эта строка
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по полнотекстовому индексу вместо LIKE '%...%'
+        if not search_term or not search_available(queryset.db):
+            return super().get_search_results(
+                request, queryset, search_term)
+        return filter_by_search(queryset, search_term), False
+
 
 # При регистрации модели Post источником конфигурации для неё назначаем
 # класс PostAdmin
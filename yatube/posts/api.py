@@ -0,0 +1,108 @@
+# posts/api.py
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
+from .models import Group, Post, User
+from .paginators import decode_cursor, make_cursor, older_than
+
+# Поля поста в ответе API; values() избавляет от создания моделей
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'updated', 'author__username', 'group__slug')
+API_CHUNK_SIZE = 500
+
+
+def _dumps(value):
+    return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def _serialize_post(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'updated': row['updated'],
+        'author': row['author__username'],
+        'group': row['group__slug'],
+    }
+
+
+def _get_limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        limit = settings.API_PAGE_SIZE
+    return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+
+def _stream_feed(request, queryset, header=None):
+    """Отдаёт ленту постов кусками, не собирая ответ в памяти.
+
+    Ответ имеет вид ``{...header, "results": [...], "next": "<курсор>"}``;
+    курсор для следующей страницы становится известен только в конце,
+    поэтому ``next`` идёт последним.
+    """
+    limit = _get_limit(request)
+    cursor = decode_cursor(request.GET.get('after'))
+    if cursor is not None:
+        queryset = older_than(queryset, cursor)
+    rows = queryset.order_by('-pub_date', '-id').values(*POST_FIELDS)
+    rows = rows[:limit + 1].iterator(chunk_size=API_CHUNK_SIZE)
+
+    def generate():
+        yield '{'
+        for key, value in (header or {}).items():
+            yield f'{_dumps(key)}: {_dumps(value)}, '
+        yield '"results": ['
+        last = None
+        next_cursor = None
+        for position, row in enumerate(rows):
+            if position == limit:
+                # Лишняя строка означает, что есть следующая страница
+                next_cursor = make_cursor(last['pub_date'], last['id'])
+                break
+            if position:
+                yield ', '
+            yield _dumps(_serialize_post(row))
+            last = row
+        yield f'], "next": {_dumps(next_cursor)}}}'
+
+    return StreamingHttpResponse(
+        generate(), content_type='application/json; charset=utf-8')
+
+
+def index(request):
+    return _stream_feed(request, Post.objects.all())
+
+
+def group_posts(request, slug):
+    group = get_object_or_404(
+        Group.objects.values(
+            'id', 'title', 'slug', 'description', 'posts_count'),
+        slug=slug)
+    return _stream_feed(
+        request, Post.objects.filter(group_id=group['id']),
+        {'group': group})
+
+
+def profile(request, username):
+    author = get_object_or_404(
+        User.objects.values(
+            'id', 'username', 'first_name', 'last_name',
+            'post_stats__posts_count'),
+        username=username)
+    author['posts_count'] = author.pop('post_stats__posts_count') or 0
+    return _stream_feed(
+        request, Post.objects.filter(author_id=author['id']),
+        {'author': author})
+
+
+def post_detail(request, post_id):
+    row = Post.objects.filter(pk=post_id).values(*POST_FIELDS).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(
+        _serialize_post(row), json_dumps_params={'ensure_ascii': False})
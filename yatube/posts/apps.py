@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def install_search_index(using, **kwargs):
+    from .search import install_search_index
+    install_search_index(using)
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        # Подключаем обработчики сигналов моделей
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search_index, sender=self)
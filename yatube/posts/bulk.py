@@ -0,0 +1,23 @@
+# posts/bulk.py
+from contextlib import contextmanager
+
+from .models import Post
+
+
+@contextmanager
+def preserve_timestamps():
+    """Позволяет сохранять посты со своими датами публикации и изменения.
+
+    У pub_date стоит auto_now_add, у updated — auto_now, и bulk_create
+    перезаписывает их текущим временем; на время импорта и генерации
+    данных отключаем это.
+    """
+    pub_date = Post._meta.get_field('pub_date')
+    updated = Post._meta.get_field('updated')
+    pub_date.auto_now_add = False
+    updated.auto_now = False
+    try:
+        yield
+    finally:
+        pub_date.auto_now_add = True
+        updated.auto_now = True
@@ -0,0 +1,166 @@
+# posts/cache.py
+from functools import wraps
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+
+from core.db_router import primary_reads
+
+SCOPE_KEY = 'posts:scope:{}'
+PAGE_KEY = 'posts:page:{}:{}'
+COUNT_KEY = 'posts:count:{}'
+HITS_KEY = 'posts:page_cache:hits'
+MISSES_KEY = 'posts:page_cache:misses'
+
+
+def _digest(value):
+    # Слаги и имена пользователей могут содержать пробелы и кириллицу,
+    # а ключ кэша должен быть безопасен для любого бэкенда
+    return md5(value.encode()).hexdigest()
+
+
+def scope_version(scope):
+    """Текущая версия области кэша (лента, группа, автор или пост).
+
+    Версия — случайный токен, поэтому после сброса старые ключи
+    просто перестают читаться и вытесняются по таймауту.
+    """
+    key = SCOPE_KEY.format(_digest(scope))
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_scopes(scopes):
+    cache.set_many(
+        {SCOPE_KEY.format(_digest(scope)): uuid4().hex
+         for scope in set(scopes)},
+        None,
+    )
+
+
+def post_scopes(post, previous=None):
+    """Области кэша, которые задевает изменение поста."""
+    scopes = ['index', f'post:{post.pk}', f'author:{post.author.username}']
+    if post.group_id is not None:
+        scopes.append(f'group:{post.group.slug}')
+    if previous is not None:
+        scopes.append(f'author:{previous["author__username"]}')
+        if previous['group__slug'] is not None:
+            scopes.append(f'group:{previous["group__slug"]}')
+    return scopes
+
+
+def get_or_build(key, build, timeout, tag):
+    """Значение ключа для версии области ``tag`` или результат build().
+
+    Двухуровневый кэш (core.cache_backends) пересчитывает значение
+    один раз на все процессы и отдаёт старую версию, пока идёт пересчёт.
+    С другими бэкендами версия просто входит в ключ.
+    """
+    def build_on_primary():
+        # Версия области меняется сразу после записи, а реплика может
+        # отставать: то, что кэшируется под новой версией, читаем
+        # с основной базы
+        with primary_reads():
+            return build()
+
+    get_or_build = getattr(cache, 'get_or_build', None)
+    if get_or_build is not None:
+        return get_or_build(key, build_on_primary, timeout, tag=tag)
+    key = f'{key}:{tag}'
+    value = cache.get(key)
+    if value is None:
+        value = build_on_primary()
+        if value is not None:
+            cache.set(key, value, timeout)
+    return value
+
+
+def cached_count(scope, compute):
+    """Число постов области, закэшированное до её следующего изменения."""
+    return get_or_build(
+        COUNT_KEY.format(_digest(scope)), compute,
+        settings.PAGINATOR_COUNT_TIMEOUT, scope_version(scope))
+
+
+def _count(key):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # ключ успели вытеснить между add и incr
+        cache.set(key, 1, None)
+
+
+def cache_is_process_local():
+    """Кэш (или его общий уровень) живёт только в памяти процесса.
+
+    Тогда management-команда работает с собственным пустым кэшем
+    и не видит того, что накопили рабочие процессы.
+    """
+    return isinstance(getattr(cache, 'shared', cache), LocMemCache)
+
+
+def page_cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_page_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def page_cache_key(scope, request):
+    path = _digest(request.get_full_path())
+    return PAGE_KEY.format(_digest(scope), path)
+
+
+def cache_anonymous_page(scope):
+    """Кэширует готовую страницу для неавторизованных пользователей.
+
+    ``scope`` — шаблон области кэша, который заполняется аргументами
+    view, например ``'group:{slug}'``. Ключ страницы учитывает полный
+    адрес запроса, то есть номер страницы или курсор.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method != 'GET'
+                    or not settings.PAGE_CACHE_TIMEOUT
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            page_scope = scope.format(**kwargs)
+            built = []
+
+            def build():
+                response = view(request, *args, **kwargs)
+                built.append(response)
+                if response.status_code == 200 and not response.streaming:
+                    return response
+                return None
+
+            response = get_or_build(
+                page_cache_key(page_scope, request), build,
+                settings.PAGE_CACHE_TIMEOUT, scope_version(page_scope))
+            if built:
+                _count(MISSES_KEY)
+                response = built[0]
+                response['X-Page-Cache'] = 'MISS'
+            else:
+                _count(HITS_KEY)
+                response['X-Page-Cache'] = 'HIT'
+            return response
+        return wrapper
+    return decorator
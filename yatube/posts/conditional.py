@@ -0,0 +1,57 @@
+# posts/conditional.py
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.http import Http404
+
+from .cache import scope_version
+from .models import Post
+
+
+def _user_key(request):
+    # Шапка страницы зависит от пользователя, поэтому и валидатор тоже
+    return request.user.pk if request.user.is_authenticated else 0
+
+
+def feed_etag(scope):
+    """Функция ETag для ленты по области кэша.
+
+    Версия области меняется при любой записи поста в эту ленту, так что
+    вместе с адресом страницы она однозначно определяет ответ и не
+    требует запросов к базе. Просмотры постов область не меняют,
+    поэтому ETag ещё и сменяется раз в PAGE_CACHE_TIMEOUT секунд —
+    столько же, сколько живёт страница в кэше.
+    """
+    def etag(request, *args, **kwargs):
+        scope_name = scope.format(**kwargs)
+        period = int(time.time() // max(settings.PAGE_CACHE_TIMEOUT, 1))
+        raw = (
+            f'{scope_name}:{scope_version(scope_name)}:{period}:'
+            f'{request.get_full_path()}:{_user_key(request)}'
+        )
+        return md5(raw.encode()).hexdigest()
+    return etag
+
+
+def _post_state(request, post_id):
+    # Один лёгкий запрос на валидатор; Last-Modified не отдаём: число
+    # постов автора и просмотры на странице не меняют Post.updated
+    if getattr(request, '_post_state', None) is None:
+        state = Post.objects.filter(pk=post_id).values_list(
+            'updated', 'author__username').first()
+        if state is None:
+            raise Http404
+        request._post_state = state
+    return request._post_state
+
+
+def post_etag(request, post_id):
+    updated, username = _post_state(request, post_id)
+    # На странице поста выводится число постов автора,
+    # поэтому учитываем и версию области автора
+    raw = (
+        f'{updated.isoformat()}:{scope_version(f"post:{post_id}")}:'
+        f'{scope_version(f"author:{username}")}:{_user_key(request)}'
+    )
+    return md5(raw.encode()).hexdigest()
@@ -0,0 +1,188 @@
+# posts/counters.py
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from core.db_router import PRIMARY
+from core.sqlite import retry_on_lock
+from .cache import bump_scopes
+from .models import AuthorStats, Group, Post
+
+logger = logging.getLogger(__name__)
+
+# Каждый пост в UPDATE ... CASE занимает три параметра, а SQLite
+# по умолчанию принимает не больше 999
+VIEWS_BATCH_SIZE = 300
+
+
+def change_author_count(user_id, delta):
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        posts_count=F('posts_count') + delta)
+    # Строку счётчика заводим только на прибавлении: при удалении
+    # автора она уже может быть удалена каскадом вместе с ним
+    if not updated and delta > 0:
+        AuthorStats.objects.get_or_create(
+            user_id=user_id,
+            defaults={
+                'posts_count': Post.objects.filter(author_id=user_id).count()
+            },
+        )
+
+
+def change_group_count(group_id, delta):
+    if group_id is None:
+        return
+    Group.objects.filter(pk=group_id).update(
+        posts_count=F('posts_count') + delta)
+
+
+def rebuild_counters(fix=True):
+    """Пересчитываем счётчики с нуля.
+
+    Возвращает расхождения в виде списков кортежей
+    (объект, сохранённое значение, настоящее значение).
+    """
+    author_drift = []
+    actual = dict(
+        Post.objects.order_by().values_list('author_id').annotate(
+            total=Count('id'))
+    )
+    stored = {stats.user_id: stats for stats in AuthorStats.objects.all()}
+    to_update = []
+    for user_id, stats in stored.items():
+        real = actual.get(user_id, 0)
+        if stats.posts_count != real:
+            author_drift.append((user_id, stats.posts_count, real))
+            stats.posts_count = real
+            to_update.append(stats)
+    to_create = [
+        AuthorStats(user_id=user_id, posts_count=real)
+        for user_id, real in actual.items()
+        if user_id not in stored
+    ]
+    author_drift.extend(
+        (stats.user_id, None, stats.posts_count) for stats in to_create)
+    if fix:
+        AuthorStats.objects.bulk_update(
+            to_update, ['posts_count'], batch_size=500)
+        AuthorStats.objects.bulk_create(to_create, batch_size=500)
+
+    group_drift = []
+    groups = Group.objects.annotate(real=Count('posts')).only(
+        'id', 'posts_count')
+    to_update = []
+    for group in groups:
+        if group.posts_count != group.real:
+            group_drift.append((group.pk, group.posts_count, group.real))
+            group.posts_count = group.real
+            to_update.append(group)
+    if fix:
+        Group.objects.bulk_update(to_update, ['posts_count'], batch_size=500)
+    return author_drift, group_drift
+
+
+@retry_on_lock
+def add_post_views(deltas):
+    """Прибавляет просмотры постам одним UPDATE ... CASE на пачку."""
+    ids = list(deltas)
+    # Пачки пишутся одной транзакцией, иначе повтор после блокировки
+    # прибавил бы уже записанные пачки второй раз
+    with transaction.atomic(using=PRIMARY):
+        for start in range(0, len(ids), VIEWS_BATCH_SIZE):
+            batch = ids[start:start + VIEWS_BATCH_SIZE]
+            # Пишем прямо в основную базу: запись через роутер закрепила
+            # бы за ней пользователя, на чьём запросе случился сброс
+            Post.objects.using(PRIMARY).filter(pk__in=batch).update(
+                views_count=F('views_count') + Case(
+                    *[When(pk=pk, then=Value(deltas[pk])) for pk in batch],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                ))
+
+
+class ViewCounter:
+    """Счётчик просмотров постов в памяти процесса.
+
+    Просмотры копятся по id поста и пишутся в базу одним запросом,
+    когда с прошлого сброса прошло VIEW_COUNT_FLUSH_INTERVAL секунд
+    или набралось VIEW_COUNT_FLUSH_EVENTS просмотров. Если запись
+    не удалась, просмотры возвращаются в очередь до следующего сброса.
+
+    После записи сбрасываются области кэша записанных постов. Области
+    лент не трогаются, чтобы не пересчитывать их каждые несколько
+    секунд: в лентах число просмотров отстаёт не больше чем
+    на PAGE_CACHE_TIMEOUT.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.events = 0
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def paused(self):
+        """Не считает просмотры в текущем потоке, например на замерах."""
+        previous = getattr(self.local, 'paused', False)
+        self.local.paused = True
+        try:
+            yield
+        finally:
+            self.local.paused = previous
+
+    def record(self, post_id):
+        if getattr(self.local, 'paused', False):
+            return
+        with self.lock:
+            self.pending[post_id] = self.pending.get(post_id, 0) + 1
+            self.events += 1
+            due = (
+                self.events >= settings.VIEW_COUNT_FLUSH_EVENTS
+                or time.monotonic() - self.flushed_at
+                >= settings.VIEW_COUNT_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Пишет накопленные просмотры; возвращает число постов."""
+        with self.lock:
+            deltas, self.pending = self.pending, {}
+            self.events = 0
+            self.flushed_at = time.monotonic()
+        if not deltas:
+            return 0
+        try:
+            add_post_views(deltas)
+        except DatabaseError:
+            logger.exception('Не удалось записать просмотры %d постов',
+                             len(deltas))
+            with self.lock:
+                for pk, delta in deltas.items():
+                    self.pending[pk] = self.pending.get(pk, 0) + delta
+            return 0
+        # update() не трогает Post.updated, поэтому страницу поста
+        # и её ETag сбрасываем сами
+        bump_scopes([f'post:{pk}' for pk in deltas])
+        return len(deltas)
+
+
+post_views = ViewCounter()
+
+
+def count_post_view(view):
+    """Считает просмотр поста, даже если страница отдана из кэша."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.method == 'GET' and response.status_code in (200, 304):
+            post_views.record(int(kwargs['post_id']))
+        return response
+    return wrapper
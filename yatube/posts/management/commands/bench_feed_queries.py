@@ -0,0 +1,100 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+
+from posts.models import Group, Post
+
+User = get_user_model()
+FEED_INDEXES = ('post_feed_idx', 'post_author_feed_idx', 'post_group_feed_idx')
+PAGE_SIZE = 10
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает EXPLAIN QUERY PLAN и время запросов лент '
+        'с составными индексами и без них'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнять каждый запрос',
+        )
+
+    def handle(self, *args, **options):
+        # Данные заводит seed_scale: он же пересчитывает счётчики,
+        # ленты и кэш, чтобы сайт на той же базе оставался целым
+        if not Post.objects.exists():
+            raise CommandError(
+                'В базе нет постов; сначала запустите seed_scale')
+        queries = self.feed_queries()
+        self.stdout.write(self.style.MIGRATE_HEADING('С индексами'))
+        after = self.run(queries, options['repeat'], 'after')
+        # Удаляем индексы внутри транзакции и откатываем её в конце,
+        # так что база остаётся в прежнем виде
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for name in FEED_INDEXES:
+                    cursor.execute(
+                        f'DROP INDEX {connection.ops.quote_name(name)}')
+                self.stdout.write(self.style.MIGRATE_HEADING('Без индексов'))
+                before = self.run(queries, options['repeat'], 'before')
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(self.style.MIGRATE_HEADING('Итого, мс (медиана)'))
+        for name in queries:
+            self.stdout.write(
+                f'{name:<16} без: {before[name]:8.3f}  '
+                f'с: {after[name]:8.3f}'
+            )
+
+    def feed_queries(self):
+        author = (
+            User.objects.annotate(total=Count('posts'))
+            .order_by('-total').first()
+        )
+        group = (
+            Group.objects.annotate(total=Count('posts'))
+            .order_by('-total').first()
+        )
+        queries = {
+            'index': Post.objects.for_feed()[:PAGE_SIZE],
+            'index_deep': Post.objects.for_feed()[
+                PAGE_SIZE * 1000:PAGE_SIZE * 1001],
+        }
+        if author is not None:
+            queries['profile'] = author.posts.for_feed()[:PAGE_SIZE]
+        if group is not None:
+            queries['group'] = group.posts.for_feed()[:PAGE_SIZE]
+        return queries
+
+    def run(self, queries, repeat, label):
+        results = {}
+        with connection.cursor() as cursor:
+            for name, queryset in queries.items():
+                sql, params = queryset.query.sql_with_params()
+                # Метка в комментарии не даёт sqlite3 взять из кэша
+                # план, подготовленный до удаления индексов
+                cursor.execute(
+                    f'EXPLAIN QUERY PLAN {sql} /* {label} */', params)
+                self.stdout.write(f'{name}:')
+                for row in cursor.fetchall():
+                    self.stdout.write(f'    {row[-1]}')
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    timings.append((time.perf_counter() - start) * 1000)
+                results[name] = statistics.median(timings)
+                self.stdout.write(f'    {results[name]:.3f} мс')
+        return results
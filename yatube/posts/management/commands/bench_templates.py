@@ -0,0 +1,100 @@
+import copy
+import statistics
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from django.urls import resolve, reverse
+
+from core.middleware import RequestTiming
+from core.template_backend import precompile_templates
+from posts.counters import post_views
+from posts.models import AuthorStats, Group, Post
+
+MODES = ('uncached', 'cached', 'precompiled')
+
+
+def templates_for(mode):
+    """Настройка TEMPLATES проекта с загрузчиками нужного режима."""
+    templates = copy.deepcopy(settings.TEMPLATES)
+    loaders = settings.TEMPLATE_LOADERS
+    if mode != 'uncached':
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    for backend in templates:
+        backend['APP_DIRS'] = False
+        backend.setdefault('OPTIONS', {})['loaders'] = loaders
+    return templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время рендеринга шаблонов лент без кэша шаблонов, '
+        'с кэширующим загрузчиком и с компиляцией при старте'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Сколько раз отрисовать каждую страницу',
+        )
+
+    def handle(self, *args, **options):
+        if not Post.objects.exists():
+            raise CommandError(
+                'В базе нет постов; сначала запустите seed_scale')
+        self.factory = RequestFactory()
+        cases = list(self.cases())
+        self.stdout.write(
+            'Время шаблона (tpl), мс: первый рендеринг / медиана остальных. '
+            'Ленивые запросы из шаблона одинаковы во всех режимах')
+        # Рендеринги замера не должны попадать в счётчик просмотров
+        with post_views.paused():
+            for mode in options['modes']:
+                self.stdout.write(self.style.MIGRATE_HEADING(mode))
+                self.run_mode(mode, cases, options['repeat'])
+
+    def run_mode(self, mode, cases, repeat):
+        # Новая настройка TEMPLATES создаёт движки заново, с пустым
+        # кэшем; кэш страниц выключен, чтобы view всегда рендерили
+        with override_settings(
+                TEMPLATES=templates_for(mode), PAGE_CACHE_TIMEOUT=0):
+            if mode == 'precompiled':
+                precompile_templates()
+            for name, url in cases:
+                timings = [self.render_time(url) for _ in range(repeat)]
+                rest = timings[1:] or timings
+                self.stdout.write(
+                    f'{name:<12} {timings[0]:8.2f} / '
+                    f'{statistics.median(rest):8.2f}')
+
+    def cases(self):
+        yield 'index', reverse('posts:index_p')
+        group = Group.objects.order_by('-posts_count').first()
+        if group is not None:
+            yield 'group_list', reverse(
+                'posts:group_list', args=[group.slug])
+        stats = (
+            AuthorStats.objects.select_related('user')
+            .order_by('-posts_count').first()
+        )
+        if stats is not None:
+            yield 'profile', reverse(
+                'posts:profile', args=[stats.user.username])
+        post = Post.objects.first()
+        yield 'post_detail', reverse('posts:post_detail', args=[post.pk])
+
+    def render_time(self, url):
+        request = self.factory.get(url)
+        request.user = AnonymousUser()
+        # Бэкенд шаблонов пишет время рендеринга сюда, как для
+        # ServerTimingMiddleware
+        request.server_timing = RequestTiming()
+        match = resolve(request.path_info)
+        request.resolver_match = match
+        response = match.func(request, *match.args, **match.kwargs)
+        if response.status_code != 200:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+        return request.server_timing.durations.get('tpl', 0.0) * 1000
@@ -0,0 +1,231 @@
+import json
+import math
+import platform
+import statistics
+import time
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.counters import post_views
+from posts.models import AuthorStats, Group, Post
+from posts.timelines import reset_timelines
+from posts.views import POSTS_ON_PAGE
+
+User = get_user_model()
+BENCH_USERNAME = 'bench_views'
+FEED_VIEWS = ('index', 'group_list', 'profile')
+ALL_VIEWS = FEED_VIEWS + ('post_detail', 'post_create')
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(timings, share):
+    """Перцентиль по ближайшему рангу для уже отсортированного списка."""
+    if not timings:
+        return 0.0
+    rank = max(math.ceil(share / 100 * len(timings)), 1)
+    return timings[rank - 1]
+
+
+def summarize(timings, queries, sizes):
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries': max(queries),
+        'bytes': max(sizes),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа основных страниц через тестовый клиент: '
+        'p50/p95/p99, число запросов и размер ответа'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--views', nargs='+', choices=ALL_VIEWS, default=list(ALL_VIEWS))
+        parser.add_argument(
+            '--pages', nargs='+', type=int, default=[1, 10, 100],
+            help='Номера страниц лент, которые нужно замерить',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Сколько раз запрашивать каждую страницу',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Сколько запросов сделать до замеров',
+        )
+        parser.add_argument(
+            '--anonymous', action='store_true',
+            help='Ходить анонимно, то есть через кэш страниц',
+        )
+        parser.add_argument('--output', help='Куда сохранить результаты JSON')
+        parser.add_argument(
+            '--compare', help='JSON прошлого запуска для сравнения')
+        parser.add_argument(
+            '--threshold', type=float, default=10.0,
+            help='Рост p95 в процентах, который считается регрессией',
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Завершиться с ошибкой, если нашлись регрессии',
+        )
+
+    def handle(self, *args, **options):
+        if not Post.objects.exists():
+            raise CommandError(
+                'В базе нет постов; сначала запустите seed_scale')
+        # Всё, что создаёт замер (пользователь, сессия, посты), живёт
+        # в транзакции, которая откатывается в конце; просмотры копятся
+        # в памяти и пережили бы откат, поэтому их не считаем
+        try:
+            with transaction.atomic(), post_views.paused():
+                results = self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+        # Откаченные посты могли попасть в ленты в кэше
+        reset_timelines()
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'posts': Post.objects.count(),
+            'anonymous': options['anonymous'],
+            'repeat': options['repeat'],
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+        if options['compare']:
+            with open(options['compare']) as previous:
+                regressions = self.compare(
+                    json.load(previous), report, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(
+                    f'Регрессии: {", ".join(regressions)}')
+
+    def run(self, options):
+        client = Client()
+        if not options['anonymous']:
+            user, _ = User.objects.get_or_create(username=BENCH_USERNAME)
+            client.force_login(user)
+        results = {}
+        for name, url in self.cases(options):
+            results[name] = self.measure(
+                client, 'get', url, {}, options['repeat'], options['warmup'])
+            self.report(name, results[name])
+        if 'post_create' in options['views'] and not options['anonymous']:
+            url = reverse('posts:post_create')
+            results['post_create:submit'] = self.measure(
+                client, 'post', url, {'text': 'Замер'},
+                options['repeat'], options['warmup'])
+            self.report('post_create:submit', results['post_create:submit'])
+        return results
+
+    def cases(self, options):
+        views = options['views']
+        pages = options['pages']
+        feeds = []
+        if 'index' in views:
+            feeds.append(
+                ('index', reverse('posts:index_p'), Post.objects.count()))
+        group = Group.objects.order_by('-posts_count').first()
+        if 'group_list' in views and group is not None:
+            feeds.append((
+                'group_list',
+                reverse('posts:group_list', args=[group.slug]),
+                group.posts_count,
+            ))
+        stats = (
+            AuthorStats.objects.select_related('user')
+            .order_by('-posts_count').first()
+        )
+        if 'profile' in views and stats is not None:
+            feeds.append((
+                'profile',
+                reverse('posts:profile', args=[stats.user.username]),
+                stats.posts_count,
+            ))
+        for name, url, total in feeds:
+            last_page = max(math.ceil(total / POSTS_ON_PAGE), 1)
+            for page in pages:
+                # Несуществующие страницы отдали бы последнюю и
+                # исказили бы сравнение глубины
+                if page <= last_page:
+                    yield f'{name}:page={page}', f'{url}?page={page}'
+        if 'post_detail' in views:
+            post = Post.objects.first()
+            yield 'post_detail', reverse('posts:post_detail', args=[post.pk])
+        if 'post_create' in views and not options['anonymous']:
+            yield 'post_create:form', reverse('posts:post_create')
+
+    def measure(self, client, method, url, data, repeat, warmup):
+        request = getattr(client, method)
+        for _ in range(warmup):
+            request(url, data)
+        timings, queries, sizes = [], [], []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = request(url, data)
+                if response.streaming:
+                    size = sum(len(chunk) for chunk in response)
+                else:
+                    size = len(response.content)
+                timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+            queries.append(len(captured))
+            sizes.append(size)
+        return summarize(timings, queries, sizes)
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<28} p50 {result["p50_ms"]:8.2f}  '
+            f'p95 {result["p95_ms"]:8.2f}  p99 {result["p99_ms"]:8.2f} мс  '
+            f'запросов {result["queries"]:3}  байт {result["bytes"]}'
+        )
+
+    def compare(self, previous, current, threshold):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Сравнение с запуском {previous.get("created", "?")}'))
+        regressions = []
+        for name, result in current['results'].items():
+            before = previous.get('results', {}).get(name)
+            if before is None:
+                self.stdout.write(f'{name:<28} новый замер')
+                continue
+            change = (
+                (result['p95_ms'] - before['p95_ms'])
+                / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            )
+            line = (
+                f'{name:<28} p95 {before["p95_ms"]:8.2f} -> '
+                f'{result["p95_ms"]:8.2f} мс ({change:+.1f}%)  '
+                f'запросов {before["queries"]} -> {result["queries"]}'
+            )
+            if change > threshold or result['queries'] > before['queries']:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return regressions
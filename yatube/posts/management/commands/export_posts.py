@@ -0,0 +1,146 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from posts.models import Post
+
+# Имена author и group совпадают с полями import_posts,
+# так что выгрузку можно загрузить обратно
+FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated': 'updated',
+    'author': 'author__username',
+    'author_first_name': 'author__first_name',
+    'author_last_name': 'author__last_name',
+    'group': 'group__slug',
+    'group_title': 'group__title',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты с авторами и группами в NDJSON или CSV '
+        'без загрузки всей таблицы в память'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='Путь к файлу или "-" для вывода в stdout',
+        )
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'),
+            help='Формат выгрузки; по умолчанию по расширению файла',
+        )
+        parser.add_argument(
+            '--gzip', action='store_true',
+            help='Сжимать выгрузку (включается само для файлов .gz)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument(
+            '--since-pub-date',
+            help='Выгружать только посты после этой даты (ISO 8601)',
+        )
+        parser.add_argument(
+            '--since-id', type=int, default=0,
+            help='Вместе с --since-pub-date: id последнего выгруженного поста',
+        )
+        parser.add_argument(
+            '--watermark-file',
+            help='Файл с отметкой прошлой выгрузки; читается и обновляется',
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        name = output[:-3] if output.endswith('.gz') else output
+        fmt = options['format'] or (
+            'csv' if name.endswith('.csv') else 'ndjson')
+        compress = options['gzip'] or output.endswith('.gz')
+
+        since = self.get_watermark(options)
+        queryset = Post.objects.order_by('pub_date', 'id')
+        if since is not None:
+            pub_date, pk = since
+            queryset = queryset.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk))
+        rows = queryset.values(*FIELDS.values()).iterator(
+            chunk_size=options['chunk_size'])
+
+        stream = self.open_output(output, compress)
+        try:
+            count, last = self.write(stream, rows, fmt)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        if last is not None and options['watermark_file']:
+            self.save_watermark(options['watermark_file'], last)
+        # Итог пишем в stderr, чтобы не портить выгрузку в stdout
+        self.stderr.write(f'Выгружено постов: {count}')
+        if last is not None:
+            self.stderr.write(
+                f'Отметка: --since-pub-date {last[0].isoformat()} '
+                f'--since-id {last[1]}'
+            )
+
+    def get_watermark(self, options):
+        if options['since_pub_date']:
+            pub_date = parse_datetime(options['since_pub_date'])
+            if pub_date is None:
+                raise CommandError('Не удалось разобрать --since-pub-date')
+            return pub_date, options['since_id']
+        path = options['watermark_file']
+        if path and os.path.exists(path):
+            with open(path) as watermark:
+                data = json.load(watermark)
+            return parse_datetime(data['pub_date']), data['id']
+        return None
+
+    def save_watermark(self, path, last):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as watermark:
+            json.dump({'pub_date': last[0].isoformat(), 'id': last[1]},
+                      watermark)
+        os.replace(tmp, path)
+
+    def open_output(self, output, compress):
+        if output == '-':
+            if compress:
+                return io.TextIOWrapper(
+                    gzip.GzipFile(fileobj=sys.stdout.buffer, mode='wb'),
+                    encoding='utf-8')
+            return sys.stdout
+        if compress:
+            return gzip.open(output, 'wt', encoding='utf-8', newline='')
+        return open(output, 'w', encoding='utf-8', newline='')
+
+    def write(self, stream, rows, fmt):
+        count = 0
+        last = None
+        writer = None
+        if fmt == 'csv':
+            writer = csv.writer(stream)
+            writer.writerow(FIELDS)
+        for row in rows:
+            values = [
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in (row[source] for source in FIELDS.values())
+            ]
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                stream.write(json.dumps(
+                    dict(zip(FIELDS, values)), ensure_ascii=False))
+                stream.write('\n')
+            count += 1
+            last = (row['pub_date'], row['id'])
+        return count, last
@@ -0,0 +1,210 @@
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.bulk import preserve_timestamps
+from posts.cache import bump_scopes
+from posts.counters import change_author_count, change_group_count
+from posts.models import Group, Post
+from posts.timelines import invalidate_timelines
+
+User = get_user_model()
+
+
+def parse_date(value, default):
+    parsed = parse_datetime(value or '')
+    if parsed is None:
+        return default
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково импортирует посты из NDJSON или CSV '
+        '(поля text, author, group, pub_date, updated)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source', help='Путь к файлу или "-" для чтения из stdin')
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'),
+            help='Формат входных данных; по умолчанию по расширению файла',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--state-file',
+            help='Файл с номером последней сохранённой строки; '
+                 'по умолчанию <source>.import-state',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с последней сохранённой пачки',
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать неизвестных авторов и группы',
+        )
+
+    def handle(self, *args, **options):
+        source = options['source']
+        state_file = options['state_file']
+        if state_file is None:
+            if source == '-':
+                if options['resume']:
+                    raise CommandError(
+                        'Для продолжения импорта из stdin нужен --state-file')
+            else:
+                state_file = f'{source}.import-state'
+        fmt = options['format'] or (
+            'csv' if source.endswith('.csv') else 'ndjson')
+        skip = self.read_state(state_file) if options['resume'] else 0
+
+        self.create_missing = options['create_missing']
+        self.authors = {}
+        self.groups = {}
+        stream = (
+            io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+            if source == '-' else open(source, encoding='utf-8', newline='')
+        )
+        with stream:
+            rows = self.read_rows(stream, fmt)
+            if skip:
+                self.stdout.write(f'Пропускаем уже загруженные строки: {skip}')
+                for _ in islice(rows, skip):
+                    pass
+            self.run(rows, options['batch_size'], skip, state_file)
+
+    def read_rows(self, stream, fmt):
+        if fmt == 'csv':
+            yield from csv.DictReader(stream)
+            return
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+    def read_state(self, state_file):
+        if state_file is None or not os.path.exists(state_file):
+            return 0
+        with open(state_file) as state:
+            return json.load(state)['rows']
+
+    def write_state(self, state_file, rows):
+        if state_file is None:
+            return
+        # Пишем через временный файл, чтобы падение не оставило мусор
+        tmp = f'{state_file}.tmp'
+        with open(tmp, 'w') as state:
+            json.dump({'rows': rows}, state)
+        os.replace(tmp, state_file)
+
+    def run(self, rows, batch_size, done, state_file):
+        started = time.monotonic()
+        imported = skipped = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            created, missed = self.import_batch(batch)
+            done += len(batch)
+            imported += created
+            skipped += missed
+            # Отметку ставим только после коммита пачки
+            self.write_state(state_file, done)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'Строк: {done}, загружено: {imported}, '
+                f'пропущено: {skipped}, '
+                f'{(imported + skipped) / elapsed:.0f} строк/с'
+            )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: загружено {imported}, пропущено {skipped} '
+            f'за {elapsed:.1f} с'
+        ))
+
+    def resolve(self, batch):
+        usernames = {row['author'] for row in batch} - set(self.authors)
+        slugs = {row['group'] for row in batch if row.get('group')}
+        slugs -= set(self.groups)
+        if usernames:
+            self.authors.update(User.objects.filter(
+                username__in=usernames).values_list('username', 'id'))
+            missing = usernames - set(self.authors)
+            if missing and self.create_missing:
+                User.objects.bulk_create(
+                    User(username=username, password='!')
+                    for username in missing)
+                self.authors.update(User.objects.filter(
+                    username__in=missing).values_list('username', 'id'))
+        if slugs:
+            self.groups.update(Group.objects.filter(
+                slug__in=slugs).values_list('slug', 'id'))
+            missing = slugs - set(self.groups)
+            if missing and self.create_missing:
+                Group.objects.bulk_create(
+                    Group(title=slug, slug=slug, description='')
+                    for slug in missing)
+                self.groups.update(Group.objects.filter(
+                    slug__in=missing).values_list('slug', 'id'))
+
+    def import_batch(self, batch):
+        now = timezone.now()
+        posts = []
+        skipped = 0
+        with transaction.atomic():
+            self.resolve(batch)
+            for row in batch:
+                author_id = self.authors.get(row['author'])
+                group_slug = row.get('group') or None
+                group_id = self.groups.get(group_slug)
+                if author_id is None or (group_slug and group_id is None):
+                    skipped += 1
+                    continue
+                try:
+                    pub_date = parse_date(row.get('pub_date'), now)
+                    updated = parse_date(row.get('updated'), pub_date)
+                except ValueError:
+                    # Дата в верном формате, но несуществующая (30 февраля)
+                    skipped += 1
+                    continue
+                posts.append(Post(
+                    text=row['text'],
+                    author_id=author_id,
+                    group_id=group_id,
+                    pub_date=pub_date,
+                    updated=updated,
+                ))
+            with preserve_timestamps():
+                Post.objects.bulk_create(posts)
+            authors = Counter(post.author_id for post in posts)
+            groups = Counter(post.group_id for post in posts if post.group_id)
+            for author_id, count in authors.items():
+                change_author_count(author_id, count)
+            for group_id, count in groups.items():
+                change_group_count(group_id, count)
+        # Массовая вставка идёт мимо сигналов, поэтому кэш страниц и ленты
+        # сбрасываем сами после каждой пачки: импорт может оборваться
+        bump_scopes(
+            ['index']
+            + [f'group:{row["group"]}' for row in batch if row.get('group')]
+            + [f'author:{row["author"]}' for row in batch]
+        )
+        invalidate_timelines(
+            [f'author:{author_id}' for author_id in authors]
+            + [f'group:{group_id}' for group_id in groups])
+        return len(posts), skipped
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import (cache_is_process_local, page_cache_stats,
+                         reset_page_cache_stats)
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша страниц для гостей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить статистику после вывода',
+        )
+
+    def handle(self, *args, **options):
+        if cache_is_process_local():
+            self.stdout.write(self.style.WARNING(
+                'Кэш — память процесса: команда видит только свою пустую '
+                'статистику. Задайте CACHE_DIR, как у рабочих процессов, '
+                'или смотрите yatube_page_cache_hit_ratio в /metrics'))
+        stats = page_cache_stats()
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {stats["ratio"]:.1%}'
+        )
+        if options['reset']:
+            reset_page_cache_stats()
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов авторов и групп с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя',
+        )
+
+    def handle(self, *args, **options):
+        fix = not options['dry_run']
+        author_drift, group_drift = rebuild_counters(fix=fix)
+        for user_id, stored, real in author_drift:
+            self.stdout.write(
+                f'Автор {user_id}: было {stored}, на самом деле {real}')
+        for group_id, stored, real in group_drift:
+            self.stdout.write(
+                f'Группа {group_id}: было {stored}, на самом деле {real}')
+        total = len(author_drift) + len(group_drift)
+        if not total:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+        elif fix:
+            self.stdout.write(
+                self.style.SUCCESS(f'Исправлено расхождений: {total}'))
+        else:
+            self.stdout.write(
+                self.style.WARNING(f'Найдено расхождений: {total}'))
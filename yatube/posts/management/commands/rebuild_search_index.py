@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.search import rebuild_search_index, search_available
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько постов индексировать за одну транзакцию',
+        )
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError('Полнотекстовый поиск доступен только в SQLite')
+        total = 0
+        for total in rebuild_search_index(options['batch_size']):
+            self.stdout.write(f'Проиндексировано постов: {total}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, всего: {total}'))
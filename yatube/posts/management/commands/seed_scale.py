@@ -0,0 +1,176 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts.cache import bump_scopes
+from posts.counters import rebuild_counters
+from posts.models import Group, Post
+from posts.search import (drop_search_triggers, install_search_index,
+                          rebuild_search_index)
+from posts.timelines import reset_timelines
+
+User = get_user_model()
+TEXT_POOL_SIZE = 5000
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса Zipf: несколько «звёзд» и длинный хвост."""
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(size)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует большой набор пользователей, групп и постов '
+        'с перекосом популярности для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=500)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--days', type=int, default=3 * 365,
+            help='За сколько последних дней разбросать даты постов',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель Zipf для авторов и групп (больше — круче)',
+        )
+        parser.add_argument(
+            '--no-group-share', type=float, default=0.2,
+            help='Доля постов без группы',
+        )
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--locale', default='ru_RU')
+        parser.add_argument('--seed', type=int, help='Зерно генератора')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.faker = Faker(options['locale'])
+        if options['seed'] is not None:
+            self.faker.seed_instance(options['seed'])
+        # Метка в именах позволяет запускать генерацию повторно
+        self.stamp = format(int(time.time()), 'x')
+        started = time.monotonic()
+
+        user_ids = self.create_users(options['users'], options['password'])
+        group_ids = self.create_groups(options['groups'])
+        self.create_posts(options, user_ids, group_ids)
+
+        self.stdout.write('Пересчитываем счётчики и поисковый индекс')
+        rebuild_counters()
+        for _ in rebuild_search_index(batch_size=50000):
+            pass
+        reset_timelines()
+        bump_scopes(['index'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'))
+
+    def create_users(self, total, password):
+        # Хэш пароля считаем один раз: PBKDF2 на каждого занял бы часы
+        password = make_password(password)
+        prefix = f'seed{self.stamp}_'
+        for start in range(0, total, 5000):
+            User.objects.bulk_create(
+                User(
+                    username=f'{prefix}{i}',
+                    first_name=self.faker.first_name(),
+                    last_name=self.faker.last_name(),
+                    password=password,
+                )
+                for i in range(start, min(start + 5000, total))
+            )
+        self.stdout.write(f'Пользователей: {total}')
+        return list(User.objects.filter(
+            username__startswith=prefix).values_list('id', flat=True))
+
+    def create_groups(self, total):
+        prefix = f'seed-{self.stamp}-'
+        Group.objects.bulk_create(
+            (
+                Group(
+                    title=self.faker.catch_phrase()[:200],
+                    slug=f'{prefix}{i}',
+                    description=self.faker.paragraph(),
+                )
+                for i in range(total)
+            ),
+            batch_size=5000,
+        )
+        self.stdout.write(f'Групп: {total}')
+        return list(Group.objects.filter(
+            slug__startswith=prefix).values_list('id', flat=True))
+
+    def create_posts(self, options, user_ids, group_ids):
+        total = options['posts']
+        batch_size = options['batch_size']
+        rnd = self.random
+        texts = [self.faker.paragraph(nb_sentences=rnd.randint(1, 6))
+                 for _ in range(TEXT_POOL_SIZE)]
+        user_ids = user_ids[:]
+        group_ids = group_ids[:]
+        rnd.shuffle(user_ids)
+        rnd.shuffle(group_ids)
+        user_weights = zipf_weights(len(user_ids), options['skew'])
+        group_weights = zipf_weights(len(group_ids), options['skew'])
+        no_group = options['no_group_share']
+        # Даты пишем сразу в формате, в котором их хранит бэкенд SQLite
+        # (наивное UTC), чтобы не адаптировать каждое значение через ORM
+        now = timezone.now().astimezone(timezone.utc).replace(tzinfo=None)
+        span = options['days'] * 24 * 3600
+
+        meta = Post._meta
+        quote = connection.ops.quote_name
+        columns = ', '.join(
+            quote(meta.get_field(name).column)
+            for name in ('text', 'author', 'group', 'pub_date', 'updated',
+                         'views_count'))
+        sql = (
+            f'INSERT INTO {quote(meta.db_table)} ({columns}) '
+            'VALUES (%s, %s, %s, %s, %s, %s)'
+        )
+
+        # Триггеры полнотекстового индекса замедляют вставку в разы,
+        # поэтому индекс строим одним проходом в конце
+        drop_search_triggers()
+        # Прерванная загрузка не должна оставить таблицу без триггеров:
+        # иначе поиск молча перестанет видеть новые и изменённые посты
+        try:
+            started = time.monotonic()
+            done = 0
+            while done < total:
+                size = min(batch_size, total - done)
+                authors = rnd.choices(
+                    user_ids, cum_weights=user_weights, k=size)
+                groups = (
+                    rnd.choices(group_ids, cum_weights=group_weights, k=size)
+                    if group_ids else [None] * size
+                )
+                rows = []
+                for author_id, group_id in zip(authors, groups):
+                    date = str(now - timedelta(seconds=rnd.randrange(span)))
+                    rows.append((
+                        rnd.choice(texts),
+                        author_id,
+                        None if rnd.random() < no_group else group_id,
+                        date,
+                        date,
+                        0,
+                    ))
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.executemany(sql, rows)
+                done += size
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Постов: {done}/{total}, {done / elapsed:.0f} в секунду')
+        finally:
+            install_search_index()
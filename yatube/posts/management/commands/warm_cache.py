@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from posts.cache import cache_is_process_local
+from posts.models import AuthorStats, Group
+from posts.paginators import estimate_post_count
+from posts.views import POSTS_ON_PAGE
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кэш страниц после выкладки: первые страницы ленты, '
+        'самых активных групп и авторов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--authors', type=int, default=20)
+        parser.add_argument(
+            '--pages', type=int, default=3,
+            help='Сколько первых страниц каждой ленты отрисовать',
+        )
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        if not settings.PAGE_CACHE_TIMEOUT:
+            self.stdout.write('Кэш страниц выключен, греть нечего')
+            return
+        if cache_is_process_local():
+            self.stdout.write(self.style.WARNING(
+                'Общий кэш — память процесса: прогрев не переживёт команду. '
+                'Задайте CACHE_DIR, как у рабочих процессов'))
+        urls = list(self.urls(options))
+        self.factory = RequestFactory()
+        started = time.monotonic()
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(options['workers']) as pool:
+                results = list(pool.map(self.warm_in_thread, urls))
+        else:
+            results = [self.warm(url) for url in urls]
+        for url, status, cache_state, elapsed in results:
+            self.stdout.write(
+                f'{elapsed * 1000:8.1f} мс  {status}  {cache_state:<4}  {url}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Прогрето страниц: {len(results)} за '
+            f'{time.monotonic() - started:.1f} с'))
+
+    def urls(self, options):
+        feeds = [(reverse('posts:index_p'), estimate_post_count())]
+        groups = Group.objects.filter(posts_count__gt=0).order_by(
+            '-posts_count').values_list('slug', 'posts_count')
+        for slug, total in groups[:options['groups']]:
+            feeds.append((reverse('posts:group_list', args=[slug]), total))
+        stats = AuthorStats.objects.filter(posts_count__gt=0).order_by(
+            '-posts_count').values_list('user__username', 'posts_count')
+        for username, total in stats[:options['authors']]:
+            feeds.append((reverse('posts:profile', args=[username]), total))
+        for url, total in feeds:
+            pages = min(options['pages'], -(-total // POSTS_ON_PAGE))
+            # Первая страница открывается без ?page, как по ссылкам сайта
+            yield url
+            for page in range(2, pages + 1):
+                yield f'{url}?page={page}'
+
+    def warm_in_thread(self, url):
+        try:
+            return self.warm(url)
+        finally:
+            # У каждого потока пула своё соединение
+            connection.close()
+
+    def warm(self, url):
+        request = self.factory.get(url)
+        request.user = AnonymousUser()
+        match = resolve(request.path_info)
+        request.resolver_match = match
+        start = time.perf_counter()
+        response = match.func(request, *match.args, **match.kwargs)
+        return (url, response.status_code,
+                response.get('X-Page-Cache', '-'),
+                time.perf_counter() - start)
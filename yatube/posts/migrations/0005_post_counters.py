@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:02
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Group = apps.get_model('posts', 'Group')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    totals = Post.objects.order_by().values_list('author_id').annotate(
+        total=Count('id'))
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=user_id, posts_count=total)
+         for user_id, total in totals],
+        batch_size=500,
+    )
+    for group in Group.objects.annotate(total=Count('posts')):
+        Group.objects.filter(pk=group.pk).update(posts_count=group.total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0004_auto_20220810_2153'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='post_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='group',
+            field=models.ForeignKey(blank=True, help_text='Текст нового поста', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='posts', to='posts.Group', verbose_name='Группа поста'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='text',
+            field=models.TextField(help_text='Текст', verbose_name='Текст поста'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
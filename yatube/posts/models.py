@@ -12,15 +12,30 @@ class Group(models.Model):
     slug = models.SlugField(unique=True,
                             verbose_name='Условная ссылка на группу')
     description = models.TextField(verbose_name='Описание группы')
+    # Счётчик постов поддерживается сигналами, см. posts/signals.py
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов'
+    )
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        # Шаблоны лент обращаются к автору и группе каждого поста,
+        # подтягиваем их одним JOIN вместо запроса на каждую строку
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст поста', help_text='Текст')
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name='Дата изменения')
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -36,10 +51,47 @@ class Post(models.Model):
         verbose_name='Группа поста',
         help_text='Текст нового поста'
     )
+    # Просмотры копятся в памяти процесса и пишутся в базу пачками,
+    # см. ViewCounter в posts/counters.py
+    views_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество просмотров'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         # выводим текст поста
         return self.text[:COUNT_OF_CUT]
 
     class Meta:
-        ordering = ['-pub_date']
+        # id добавлен для однозначного порядка постов с одной датой
+        ordering = ['-pub_date', '-id']
+        # Индексы повторяют сортировку лент, чтобы база не сортировала
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_feed_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_feed_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_feed_idx'),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики автора, чтобы не считать его посты."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='post_stats',
+        verbose_name='Автор'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов'
+    )
+
+    def __str__(self):
+        return f'{self.user}: {self.posts_count}'
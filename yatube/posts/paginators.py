@@ -0,0 +1,197 @@
+# posts/paginators.py
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q, Sum
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .cache import cached_count
+from .models import AuthorStats
+
+
+def make_cursor(pub_date, pk):
+    """Упаковываем позицию поста (pub_date, id) в токен для URL."""
+    raw = f'{pub_date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def encode_cursor(post):
+    return make_cursor(post.pub_date, post.pk)
+
+
+def decode_cursor(token):
+    """Распаковываем токен курсора; на мусор отвечаем None."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.rsplit('|', 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def older_than(queryset, cursor):
+    """Посты ленты, идущие после позиции курсора (то есть старше неё)."""
+    pub_date, pk = cursor
+    return queryset.filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+
+
+class CursorPage(Page):
+    """Страница ленты, которая знает только соседей, но не общее число."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0])
+        return None
+
+    def next_page_number(self):
+        raise TypeError('У курсорной страницы нет номера')
+
+    def previous_page_number(self):
+        raise TypeError('У курсорной страницы нет номера')
+
+    def start_index(self):
+        raise TypeError('У курсорной страницы нет номера')
+
+    def end_index(self):
+        raise TypeError('У курсорной страницы нет номера')
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (pub_date, id): без COUNT(*) и без OFFSET.
+
+    Лента отсортирована от новых постов к старым, поэтому ``after``
+    ведёт к более старым записям, а ``before`` — к более новым.
+    """
+
+    def get_cursor_page(self, after=None, before=None):
+        queryset = self.object_list
+        after = decode_cursor(after)
+        before = decode_cursor(before)
+        limit = self.per_page + 1
+        if before is not None:
+            pub_date, pk = before
+            rows = list(
+                queryset.filter(
+                    Q(pub_date__gt=pub_date)
+                    | Q(pub_date=pub_date, pk__gt=pk)
+                ).order_by('pub_date', 'pk')[:limit]
+            )
+            if rows:
+                has_previous = len(rows) > self.per_page
+                rows = rows[:self.per_page]
+                rows.reverse()
+                # Пост курсора мог быть удалён, поэтому проверяем,
+                # остались ли посты старше страницы
+                has_next = older_than(
+                    queryset, (rows[-1].pub_date, rows[-1].pk)).exists()
+                return CursorPage(rows, self, has_next, has_previous)
+            # Новее курсора ничего нет: показываем первую страницу
+        elif after is not None:
+            queryset = older_than(queryset, after)
+        rows = list(queryset.order_by('-pub_date', '-pk')[:limit])
+        has_next = len(rows) > self.per_page
+        return CursorPage(
+            rows[:self.per_page], self, has_next, after is not None)
+
+
+def estimate_post_count():
+    """Число всех постов по счётчикам авторов, без COUNT(*) по постам.
+
+    Максимальный id завышал бы число после каждого удаления поста,
+    а сумма по AuthorStats точна и читает по строке на автора.
+    """
+    return AuthorStats.objects.aggregate(
+        total=Sum('posts_count'))['total'] or 0
+
+
+class CountingPaginator(Paginator):
+    """Paginator, который не считает посты на каждом запросе.
+
+    Число объектов кэшируется по области (``'index'``, ``'group:<slug>'``,
+    ``'author:<username>'``) и сбрасывается вместе с ней при записи поста.
+    Если постов больше PAGINATOR_EXACT_COUNT_LIMIT, точный COUNT(*)
+    не делается, а берётся оценка ``estimate()``.
+    """
+
+    def __init__(self, object_list, per_page, count_scope=None,
+                 estimate=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_scope = count_scope
+        self.estimate = estimate
+
+    @cached_property
+    def count(self):
+        if self.count_scope is None:
+            return self.count_objects()
+        return cached_count(self.count_scope, self.count_objects)
+
+    def count_objects(self):
+        object_list = self.object_list
+        # Неполная лента из кэша уже знает, сколько в ней постов
+        if getattr(object_list, 'complete', False):
+            return object_list.count()
+        queryset = getattr(object_list, 'queryset', object_list)
+        if self.estimate is None or not hasattr(queryset, 'query'):
+            return super().count
+        limit = settings.PAGINATOR_EXACT_COUNT_LIMIT
+        bounded = queryset.order_by()[:limit + 1].count()
+        if bounded <= limit:
+            return bounded
+        return max(self.estimate(), bounded)
+
+
+def page_window(number, num_pages, around=2):
+    """Номера страниц для навигации: первая, последняя и ±around.
+
+    Пропуски обозначены None. Список строится по номерам, без
+    ``page_range``, так что длина не зависит от числа страниц.
+    """
+    if num_pages <= 1:
+        return [1] if num_pages == 1 else []
+    start = max(number - around, 1)
+    stop = min(number + around, num_pages)
+    head = []
+    if start > 1:
+        # Одну пропущенную страницу показываем номером, а не «…»
+        head = [1, 2] if start == 3 else [1] if start == 2 else [1, None]
+    tail = []
+    if stop < num_pages:
+        tail = (
+            [num_pages - 1, num_pages] if stop == num_pages - 2
+            else [num_pages] if stop == num_pages - 1
+            else [None, num_pages]
+        )
+    return head + list(range(start, stop + 1)) + tail
@@ -0,0 +1,168 @@
+# posts/search.py
+import re
+
+from django.db import connection, connections, transaction
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+CREATE_TABLE = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+# Триггеры держат индекс в согласии с posts_post при любой записи,
+# включая bulk_create и update(), которые не шлют сигналов
+CREATE_TRIGGERS = (
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai '
+    'AFTER INSERT ON posts_post BEGIN '
+    f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+    'END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad '
+    'AFTER DELETE ON posts_post BEGIN '
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    'END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au '
+    'AFTER UPDATE OF text ON posts_post BEGIN '
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); '
+    'END',
+)
+
+
+def search_available(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def install_search_index(using='default'):
+    """Создаёт таблицу FTS5 и триггеры, если их ещё нет.
+
+    Вызывается после каждой миграции: SQLite пересоздаёт posts_post
+    при изменении полей, и триггеры старой таблицы теряются.
+    """
+    if not search_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        for sql in CREATE_TRIGGERS:
+            cursor.execute(sql)
+
+
+def drop_search_triggers(using='default'):
+    """Снимает триггеры индекса на время массовой загрузки.
+
+    После загрузки индекс перестраивают rebuild_search_index,
+    который заодно возвращает триггеры на место.
+    """
+    if not search_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+
+
+def build_match(query):
+    """Превращаем ввод пользователя в безопасный запрос MATCH.
+
+    Каждое слово берём в кавычки и ищем по префиксу, так что
+    операторы FTS5 из ввода не интерпретируются.
+    """
+    words = re.findall(r'\w+', query or '')
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+class SearchResults:
+    """Последовательность найденных постов, упорядоченных по релевантности.
+
+    Paginator берёт у неё count() и срез, поэтому с базы читается
+    только нужная страница.
+    """
+
+    def __init__(self, query):
+        self.match = build_match(query)
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        if not self.match:
+            return []
+        start = item.start or 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s ORDER BY rank '
+                'LIMIT %s OFFSET %s',
+                [self.match, item.stop - start, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def filter_by_search(queryset, query):
+    """Оставляет в queryset только посты, подходящие под запрос."""
+    match = build_match(query)
+    if not match:
+        return queryset.none()
+    return queryset.extra(
+        where=[
+            f'posts_post.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[match],
+    )
+
+
+def rebuild_search_index(batch_size=1000, using='default'):
+    """Заполняет индекс заново пачками по возрастанию id.
+
+    Каждая пачка коммитится отдельно, и в памяти не держится больше
+    одной пачки. Возвращает генератор числа обработанных постов.
+    """
+    install_search_index(using)
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+    last_id = 0
+    total = 0
+    while True:
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(
+                    'SELECT count(*), max(id) FROM (SELECT id FROM posts_post '
+                    'WHERE id > %s ORDER BY id LIMIT %s)',
+                    [last_id, batch_size],
+                )
+                count, max_id = cursor.fetchone()
+                if not count:
+                    break
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE}(rowid, text) '
+                    'SELECT id, text FROM posts_post '
+                    'WHERE id > %s AND id <= %s',
+                    [last_id, max_id],
+                )
+        last_id = max_id
+        total += count
+        yield total
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
@@ -0,0 +1,112 @@
+# posts/signals.py
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .cache import bump_scopes, post_scopes
+from .counters import change_author_count, change_group_count
+from .models import Group, Post
+from .timelines import invalidate_timelines
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_post(sender, instance, **kwargs):
+    # Запоминаем автора и группу до сохранения,
+    # чтобы при переносе поста поправить оба счётчика
+    instance._previous = None
+    if instance.pk is not None:
+        instance._previous = Post.objects.filter(pk=instance.pk).values(
+            'author_id', 'group_id', 'author__username', 'group__slug'
+        ).first()
+
+
+@receiver(post_save, sender=Post)
+def update_counters_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None:
+        change_author_count(instance.author_id, 1)
+        change_group_count(instance.group_id, 1)
+        return
+    if previous['author_id'] != instance.author_id:
+        change_author_count(previous['author_id'], -1)
+        change_author_count(instance.author_id, 1)
+    if previous['group_id'] != instance.group_id:
+        change_group_count(previous['group_id'], -1)
+        change_group_count(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def update_counters_on_delete(sender, instance, **kwargs):
+    change_author_count(instance.author_id, -1)
+    change_group_count(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_cache_on_save(sender, instance, **kwargs):
+    bump_scopes(post_scopes(instance, getattr(instance, '_previous', None)))
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_cache_on_delete(sender, instance, **kwargs):
+    bump_scopes(post_scopes(instance))
+
+
+@receiver(post_save, sender=Post)
+def update_timelines_on_save(sender, instance, **kwargs):
+    scopes = [f'author:{instance.author_id}']
+    if instance.group_id is not None:
+        scopes.append(f'group:{instance.group_id}')
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        scopes.append(f'author:{previous["author_id"]}')
+        if previous['group_id'] is not None:
+            scopes.append(f'group:{previous["group_id"]}')
+    invalidate_timelines(scopes)
+
+
+@receiver(post_delete, sender=Post)
+def update_timelines_on_delete(sender, instance, **kwargs):
+    scopes = [f'author:{instance.author_id}']
+    if instance.group_id is not None:
+        scopes.append(f'group:{instance.group_id}')
+    invalidate_timelines(scopes)
+
+
+def group_post_scopes(group):
+    """Области страниц постов группы и их авторов, одним запросом."""
+    scopes = set()
+    rows = Post.objects.filter(group=group).values_list(
+        'pk', 'author__username')
+    for pk, username in rows:
+        scopes.update((f'post:{pk}', f'author:{username}'))
+    return scopes
+
+
+@receiver(pre_save, sender=Group)
+def remember_previous_slug(sender, instance, **kwargs):
+    instance._previous_slug = None
+    if instance.pk is not None:
+        instance._previous_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    # После удаления у постов уже group=NULL, и найти их не выйдет
+    instance._post_scopes = group_post_scopes(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_cache(sender, instance, created=False, **kwargs):
+    # Заголовок и ссылка группы выводятся и в общей ленте, и в профилях
+    # авторов, и на страницах постов
+    scopes = ['index', f'group:{instance.slug}']
+    previous_slug = getattr(instance, '_previous_slug', None)
+    if previous_slug:
+        scopes.append(f'group:{previous_slug}')
+    posts = getattr(instance, '_post_scopes', None)
+    if posts is None and not created:
+        posts = group_post_scopes(instance)
+    scopes.extend(posts or ())
+    bump_scopes(scopes)
@@ -0,0 +1,12 @@
+# posts/templatetags/pagination.py
+from django import template
+
+from ..paginators import page_window as build_window
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_window(page_obj, around=2):
+    """Компактный список номеров страниц вокруг текущей (None — «…»)."""
+    return build_window(page_obj.number, page_obj.paginator.num_pages, around)
@@ -0,0 +1,93 @@
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='api_author')
+        cls.group = Group.objects.create(
+            title='Группа API', slug='api-slug', description='Описание')
+        for i in range(25):
+            Post.objects.create(
+                author=cls.author, text=f'Пост API {i}', group=cls.group)
+
+    def setUp(self):
+        self.guest = Client()
+
+    def get_json(self, address, **params):
+        response = self.guest.get(address, params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        if response.streaming:
+            return json.loads(b''.join(response.streaming_content))
+        return response.json()
+
+    def test_feed_walk_with_cursor(self):
+        """Лента API отдаётся страницами по курсору ?after=."""
+        expected = list(Post.objects.values_list('id', flat=True))
+        for address in (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', kwargs={'slug': 'api-slug'}),
+            reverse('posts:api_profile', kwargs={'username': 'api_author'}),
+        ):
+            with self.subTest(address=address):
+                seen = []
+                data = self.get_json(address, limit=10)
+                seen.extend(row['id'] for row in data['results'])
+                while data['next']:
+                    data = self.get_json(
+                        address, limit=10, after=data['next'])
+                    seen.extend(row['id'] for row in data['results'])
+                self.assertEqual(seen, expected)
+
+    def test_feed_payload(self):
+        """Лента содержит данные поста, группы и автора."""
+        data = self.get_json(
+            reverse('posts:api_group_list', kwargs={'slug': 'api-slug'}),
+            limit=1)
+        self.assertEqual(data['group']['posts_count'], 25)
+        post = data['results'][0]
+        self.assertEqual(post['author'], 'api_author')
+        self.assertEqual(post['group'], 'api-slug')
+        self.assertEqual(post['text'], 'Пост API 24')
+        data = self.get_json(
+            reverse('posts:api_profile', kwargs={'username': 'api_author'}),
+            limit=1)
+        self.assertEqual(data['author']['posts_count'], 25)
+
+    def test_large_page_is_streamed_with_one_query(self):
+        """Большая страница отдаётся потоком одним запросом к постам."""
+        response = self.guest.get(reverse('posts:api_index'), {'limit': 5000})
+        self.assertTrue(response.streaming)
+        with CaptureQueriesContext(connection) as queries:
+            data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(data['results']), 25)
+        self.assertIsNone(data['next'])
+        self.assertEqual(len(queries), 1)
+
+    def test_post_detail_and_not_found(self):
+        """Пост отдаётся целиком, несуществующие объекты — 404."""
+        post = Post.objects.first()
+        data = self.get_json(
+            reverse('posts:api_post_detail', kwargs={'post_id': post.id}))
+        self.assertEqual(data['text'], post.text)
+        for address in (
+            reverse('posts:api_post_detail', kwargs={'post_id': 0}),
+            reverse('posts:api_group_list', kwargs={'slug': 'nope'}),
+            reverse('posts:api_profile', kwargs={'username': 'nope'}),
+        ):
+            with self.subTest(address=address):
+                self.assertEqual(
+                    self.guest.get(address).status_code,
+                    HTTPStatus.NOT_FOUND)
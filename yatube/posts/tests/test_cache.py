@@ -0,0 +1,139 @@
+import shutil
+import tempfile
+import threading
+import time
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from core.cache_backends import TwoTierCache
+
+
+def make_cache(**options):
+    options.setdefault('SHARED', 'shared')
+    # Своё имя — свой локальный уровень, то есть отдельный «процесс»
+    return TwoTierCache(uuid4().hex, {'OPTIONS': options})
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+
+    def test_local_tier_is_bounded(self):
+        cache = make_cache(MAX_ENTRIES=2)
+        for key in 'abc':
+            cache.set(key, key)
+        self.assertEqual(list(cache.local.entries), [
+            cache.make_key('b'), cache.make_key('c')])
+        # Вытесненное из LRU читается из общего уровня
+        self.assertEqual(cache.get('a'), 'a')
+
+    def test_processes_share_values(self):
+        first = make_cache(LOCAL_TIMEOUT=0)
+        second = make_cache(LOCAL_TIMEOUT=0)
+        first.set('key', [1, 2])
+        value = second.get('key')
+        self.assertEqual(value, [1, 2])
+        # Изменение полученной копии не портит кэш
+        value.append(3)
+        self.assertEqual(second.get('key'), [1, 2])
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+
+    def test_incr_keeps_timeout(self):
+        cache = make_cache()
+        cache.add('hits', 0, None)
+        self.assertEqual(cache.incr('hits'), 1)
+        key = cache.make_key('hits')
+        self.assertIsNone(cache.shared.get(key)[1])
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_single_flight(self):
+        location = uuid4().hex
+        calls = []
+        results = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'страница'
+
+        def worker():
+            # Каждый поток со своим экземпляром, как в Django
+            cache = TwoTierCache(location, {'OPTIONS': {'SHARED': 'shared'}})
+            results.append(cache.get_or_build('index', build, 60, tag='v1'))
+
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['страница'] * 20)
+
+    def test_waiters_stop_when_build_returns_nothing(self):
+        location = uuid4().hex
+        waited = []
+
+        def build():
+            time.sleep(0.2)
+
+        def worker():
+            cache = TwoTierCache(location, {'OPTIONS': {'SHARED': 'shared'}})
+            start = time.monotonic()
+            cache.get_or_build('missing', build, 60, tag='v1')
+            waited.append(time.monotonic() - start)
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Без значения ждущие не должны сидеть все LOCK_WAIT секунд
+        self.assertLess(max(waited), 1)
+
+    def test_stale_value_is_served_while_rebuilding(self):
+        cache = make_cache()
+        cache.get_or_build('index', lambda: 'старая', 60, tag='v1')
+        key = cache.make_key('index')
+        # Другой процесс уже пересчитывает ключ под новой версией
+        self.assertTrue(make_cache()._acquire(key))
+        self.assertEqual(
+            cache.get_or_build('index', lambda: 'новая', 60, tag='v2'),
+            'старая')
+        cache._release(key)
+        self.assertEqual(
+            cache.get_or_build('index', lambda: 'новая', 60, tag='v2'),
+            'новая')
+
+    def test_expired_value_is_rebuilt(self):
+        cache = make_cache()
+        cache.get_or_build('count', lambda: 1, 0.05, tag='v1')
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('count'))
+        self.assertEqual(
+            cache.get_or_build('count', lambda: 2, 60, tag='v1'), 2)
+
+
+class FileSharedTierTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = override_settings(CACHES={
+            'default': {'BACKEND': 'core.cache_backends.TwoTierCache',
+                        'LOCATION': uuid4().hex},
+            'shared': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory,
+            },
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_value_survives_local_tier(self):
+        first = make_cache()
+        first.set('key', {'posts': 3})
+        self.assertEqual(make_cache().get('key'), {'posts': 3})
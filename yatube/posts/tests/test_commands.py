@@ -0,0 +1,415 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.template import engines
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.sqlite import LockRetry, retry_on_lock, run_maintenance
+from core.template_backend import precompile_templates
+
+from ..counters import post_views
+from ..management.commands.bench_templates import templates_for
+from ..models import AuthorStats, Group, Post
+from ..search import SearchResults
+
+User = get_user_model()
+
+
+class ImportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='importer')
+        cls.group = Group.objects.create(
+            title='Импорт', slug='import', description='-')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write(content)
+        return path
+
+    def ndjson(self, rows):
+        return '\n'.join(json.dumps(row, ensure_ascii=False) for row in rows)
+
+    def test_import_keeps_dates_and_counters(self):
+        """Импорт сохраняет исходные даты и обновляет счётчики."""
+        path = self.write('posts.ndjson', self.ndjson([
+            {'text': 'Старый пост', 'author': 'importer', 'group': 'import',
+             'pub_date': '2010-05-01T12:00:00+00:00'},
+            {'text': 'Без группы', 'author': 'importer',
+             'pub_date': '2011-05-01T12:00:00'},
+            {'text': 'Чужой', 'author': 'ghost'},
+            {'text': 'Несуществующая дата', 'author': 'importer',
+             'pub_date': '2020-02-30T00:00:00'},
+        ]))
+        out = StringIO()
+        call_command('import_posts', path, '--batch-size', '2', stdout=out)
+        self.assertIn('загружено 2, пропущено 2', out.getvalue())
+        post = Post.objects.get(text='Старый пост')
+        self.assertEqual(
+            post.pub_date, datetime(2010, 5, 1, 12, tzinfo=timezone.utc))
+        self.assertEqual(post.updated, post.pub_date)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).posts_count, 2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+
+    def test_csv_and_create_missing(self):
+        """CSV читается, неизвестные авторы и группы создаются по флагу."""
+        path = self.write(
+            'posts.csv',
+            'text,author,group,pub_date\n'
+            'Новый,newbie,fresh,2015-01-01T00:00:00+00:00\n',
+        )
+        call_command(
+            'import_posts', path, '--create-missing', stdout=StringIO())
+        post = Post.objects.get(text='Новый')
+        self.assertEqual(post.author.username, 'newbie')
+        self.assertEqual(post.group.slug, 'fresh')
+
+    def test_resume_skips_committed_batches(self):
+        """После сбоя импорт продолжается с последней пачки."""
+        rows = [{'text': f'Пост {i}', 'author': 'importer'} for i in range(5)]
+        path = self.write('posts.ndjson', self.ndjson(rows))
+        with open(f'{path}.import-state', 'w') as state:
+            json.dump({'rows': 3}, state)
+        call_command('import_posts', path, '--resume', stdout=StringIO())
+        self.assertEqual(
+            sorted(Post.objects.values_list('text', flat=True)),
+            ['Пост 3', 'Пост 4'])
+        with open(f'{path}.import-state') as state:
+            self.assertEqual(json.load(state), {'rows': 5})
+
+    def test_committed_batches_reach_timelines_after_crash(self):
+        """Упавший импорт не оставляет ленты без загруженных постов."""
+        cache.clear()
+        address = reverse('posts:group_list', args=['import'])
+        self.assertEqual(
+            len(self.client.get(address).context['page_obj']), 0)
+        rows = self.ndjson([
+            {'text': f'Импорт {i}', 'author': 'importer', 'group': 'import'}
+            for i in range(2)
+        ])
+        path = self.write('posts.ndjson', rows + '\n{испорчено')
+        with self.assertRaises(ValueError):
+            call_command('import_posts', path, '--batch-size', '2',
+                         stdout=StringIO())
+        page = self.client.get(address).context['page_obj']
+        self.assertEqual(page.paginator.count, 2)
+        self.assertEqual(len(page), 2)
+
+
+class ExportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='exporter', first_name='Анна')
+        cls.group = Group.objects.create(
+            title='Экспорт', slug='export', description='-')
+        for i in range(5):
+            Post.objects.create(
+                author=cls.user, text=f'Выгрузка {i}', group=cls.group)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def read_ndjson(self, path, opener=open):
+        with opener(path, 'rt', encoding='utf-8') as dump:
+            return [json.loads(line) for line in dump]
+
+    def test_export_ndjson_with_relations(self):
+        """Выгрузка содержит посты с автором и группой по порядку."""
+        path = os.path.join(self.tmp_dir, 'posts.ndjson')
+        call_command(
+            'export_posts', '--output', path, '--chunk-size', '2',
+            stderr=StringIO())
+        rows = self.read_ndjson(path)
+        self.assertEqual(
+            [row['text'] for row in rows],
+            [f'Выгрузка {i}' for i in range(5)])
+        self.assertEqual(rows[0]['author'], 'exporter')
+        self.assertEqual(rows[0]['author_first_name'], 'Анна')
+        self.assertEqual(rows[0]['group_title'], 'Экспорт')
+
+    def test_incremental_export_with_watermark(self):
+        """Повторная выгрузка с отметкой содержит только новые посты."""
+        path = os.path.join(self.tmp_dir, 'posts.ndjson.gz')
+        watermark = os.path.join(self.tmp_dir, 'watermark.json')
+        call_command(
+            'export_posts', '--output', path,
+            '--watermark-file', watermark, stderr=StringIO())
+        self.assertEqual(len(self.read_ndjson(path, gzip.open)), 5)
+        Post.objects.create(author=self.user, text='Свежий')
+        call_command(
+            'export_posts', '--output', path,
+            '--watermark-file', watermark, stderr=StringIO())
+        self.assertEqual(
+            [row['text'] for row in self.read_ndjson(path, gzip.open)],
+            ['Свежий'])
+
+    def test_export_csv(self):
+        """CSV-выгрузка начинается с заголовка."""
+        path = os.path.join(self.tmp_dir, 'posts.csv')
+        call_command('export_posts', '--output', path, stderr=StringIO())
+        with open(path, encoding='utf-8', newline='') as dump:
+            rows = list(csv.DictReader(dump))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[-1]['group'], 'export')
+
+
+class SeedScaleTest(TestCase):
+    def test_seed_creates_skewed_consistent_data(self):
+        call_command(
+            'seed_scale', users=20, groups=5, posts=500, batch_size=200,
+            seed=1, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 500)
+        counts = sorted(
+            AuthorStats.objects.values_list('posts_count', flat=True),
+            reverse=True)
+        self.assertEqual(sum(counts), 500)
+        # Самый популярный автор пишет заметно больше среднего
+        self.assertGreater(counts[0], 500 / 20 * 2)
+        self.assertEqual(
+            sum(Group.objects.values_list('posts_count', flat=True)),
+            Post.objects.filter(group__isnull=False).count())
+        post = Post.objects.first()
+        self.assertEqual(post.pub_date, post.updated)
+        self.assertTrue(User.objects.first().check_password('password'))
+        word = post.text.split()[0].strip('.,')
+        self.assertIn(post, Post.objects.filter(
+            pk__in=[p.pk for p in SearchResults(word)[:500]]))
+
+    def test_interrupted_seed_restores_search_triggers(self):
+        class Interrupting(StringIO):
+            def write(self, text):
+                if text.startswith('Постов:'):
+                    raise KeyboardInterrupt
+                return super().write(text)
+
+        with self.assertRaises(KeyboardInterrupt):
+            call_command(
+                'seed_scale', users=5, groups=2, posts=100, batch_size=50,
+                stdout=Interrupting())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'posts_post'")
+            self.assertEqual(cursor.fetchone()[0], 3)
+
+
+class BenchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'seed_scale', users=5, groups=2, posts=30, seed=2,
+            stdout=StringIO())
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_results_are_saved_and_compared(self):
+        path = os.path.join(self.tmp_dir, 'bench.json')
+        call_command(
+            'bench_views', repeat=3, warmup=0, pages=[1, 2, 50],
+            output=path, stdout=StringIO())
+        with open(path) as saved:
+            report = json.load(saved)
+        results = report['results']
+        self.assertIn('index:page=1', results)
+        self.assertIn('index:page=2', results)
+        # Страницы глубже последней не замеряются
+        self.assertNotIn('index:page=50', results)
+        self.assertIn('post_create:submit', results)
+        for result in results.values():
+            self.assertEqual(result['runs'], 3)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertGreater(results['index:page=1']['bytes'], 0)
+        # Замер ничего не оставляет в базе
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertFalse(User.objects.filter(username='bench_views').exists())
+        post_views.flush()
+        self.assertFalse(Post.objects.filter(views_count__gt=0).exists())
+
+        out = StringIO()
+        call_command(
+            'bench_views', repeat=3, warmup=0, pages=[1], compare=path,
+            threshold=10 ** 6, fail_on_regression=True, stdout=out)
+        self.assertIn('Сравнение с запуском', out.getvalue())
+
+
+@override_settings(SQLITE_PRODUCTION=True, SQLITE_LOCK_BACKOFF=0)
+class SqliteProductionTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def file_connection(self):
+        settings_dict = dict(
+            connection.settings_dict,
+            NAME=os.path.join(self.tmp_dir, 'prod.sqlite3'))
+        wrapper = DatabaseWrapper(settings_dict, alias='prod')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_are_set_on_new_connections(self):
+        wrapper = self.file_connection()
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            # NORMAL
+            self.assertEqual(cursor.fetchone()[0], 1)
+        # Переподключение не добавляет обёртку второй раз
+        wrapper.close()
+        wrapper.ensure_connection()
+        self.assertEqual(
+            sum(isinstance(item, LockRetry)
+                for item in wrapper.execute_wrappers), 1)
+
+    def test_locked_statement_is_retried_outside_transactions(self):
+        calls = []
+
+        def execute(sql, params, many, context):
+            calls.append(sql)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        retry = LockRetry(self.file_connection())
+        with self.assertLogs('core.sqlite', 'WARNING'):
+            self.assertEqual(retry(execute, 'UPDATE', [], False, {}), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_transaction_is_retried_as_a_whole(self):
+        attempts = []
+
+        @retry_on_lock
+        def write():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OperationalError('database is locked')
+            return len(attempts)
+
+        with self.assertLogs('core.sqlite', 'WARNING'):
+            self.assertEqual(write(), 2)
+
+    def test_maintenance_checkpoints_wal(self):
+        wrapper = self.file_connection()
+        with wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x)')
+            cursor.execute('INSERT INTO t VALUES (1)')
+        report = run_maintenance(wrapper, analyze=True)
+        self.assertIn('ANALYZE выполнен', report)
+        self.assertTrue(report[-1].startswith('Контрольная точка WAL'))
+
+    def test_maintenance_command(self):
+        out = StringIO()
+        call_command('sqlite_maintenance', stdout=out)
+        self.assertIn('PRAGMA optimize', out.getvalue())
+
+
+class WarmCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='busy')
+        group = Group.objects.create(title='Горячая', slug='hot',
+                                     description='-')
+        for i in range(25):
+            Post.objects.create(author=author, group=group, text=f'Пост {i}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_pages_are_cached(self):
+        out = StringIO()
+        call_command('warm_cache', pages=5, workers=1, stdout=out)
+        output = out.getvalue()
+        # В ленте 25 постов, то есть 3 страницы
+        self.assertIn('/group/hot/?page=3', output)
+        self.assertNotIn('?page=4', output)
+        self.assertIn('Прогрето страниц: 9', output)
+        response = self.client.get(reverse('posts:profile', args=['busy']))
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        response = self.client.get(reverse('posts:index_p') + '?page=2')
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+
+
+class TemplateModesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='writer')
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='-')
+        Post.objects.create(author=author, group=group, text='Пост')
+
+    def test_precompile_fills_cached_loader(self):
+        with override_settings(TEMPLATES=templates_for('cached')):
+            compiled = precompile_templates()
+            loader = engines.all()[0].engine.template_loaders[0]
+            cached = loader.get_template_cache
+        for name in ('base.html', 'includes/header.html',
+                     'posts/includes/paginator.html', 'posts/index.html'):
+            self.assertIn(name, compiled)
+            self.assertIn(name, cached)
+
+    def test_without_cached_loader_nothing_is_compiled(self):
+        with override_settings(TEMPLATES=templates_for('uncached')):
+            self.assertEqual(precompile_templates(), [])
+
+    def test_bench_templates(self):
+        out = StringIO()
+        call_command('bench_templates', repeat=2, stdout=out)
+        output = out.getvalue()
+        for mode in ('uncached', 'cached', 'precompiled'):
+            self.assertIn(mode, output)
+        for view in ('index', 'group_list', 'profile', 'post_detail'):
+            self.assertIn(view, output)
+        # Рендеринги замера не считаются просмотрами
+        post_views.flush()
+        self.assertFalse(Post.objects.filter(views_count__gt=0).exists())
+
+
+class BenchFeedQueriesTest(TestCase):
+    def test_requires_seeded_database(self):
+        with self.assertRaisesMessage(CommandError, 'seed_scale'):
+            call_command('bench_feed_queries', stdout=StringIO())
+
+    def test_compares_plans_and_keeps_indexes(self):
+        call_command(
+            'seed_scale', users=5, groups=2, posts=30, seed=3,
+            stdout=StringIO())
+        out = StringIO()
+        call_command('bench_feed_queries', repeat=1, stdout=out)
+        output = out.getvalue()
+        for name in ('index', 'profile', 'group'):
+            self.assertIn(name, output)
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table)
+        self.assertIn('post_feed_idx', indexes)
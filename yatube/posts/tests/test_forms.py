@@ -1,7 +1,9 @@
 from http import HTTPStatus
+from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.db import OperationalError
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from ..models import Group, Post
 
@@ -136,3 +138,27 @@ class FormTests(TestCase):
         )
         self.assertFalse(Post.objects.filter(
             text='Здесь бы Вася и Коля!').exists())
+
+    @override_settings(SQLITE_LOCK_BACKOFF=0)
+    def test_create_is_retried_after_lock_in_signals(self):
+        """Повтор после блокировки снова вставляет пост, а не правит."""
+        from ..counters import change_group_count
+        calls = []
+
+        def locked_once(group_id, delta):
+            calls.append(group_id)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            change_group_count(group_id, delta)
+
+        posts_count = Post.objects.count()
+        with mock.patch('posts.signals.change_group_count',
+                        side_effect=locked_once):
+            response = self.user.post(
+                reverse('posts:post_create'),
+                {'text': 'Повторённый пост', 'group': self.group_2.id})
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Post.objects.count(), posts_count + 1)
+        self.group_2.refresh_from_db()
+        self.assertEqual(self.group_2.posts_count, 1)
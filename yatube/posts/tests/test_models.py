@@ -1,7 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase, Client
 
-from ..models import Group, Post, COUNT_OF_CUT
+from ..models import AuthorStats, Group, Post, COUNT_OF_CUT
 
 User = get_user_model()
 
@@ -53,3 +57,87 @@ class PostModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     self.post._meta.get_field(value).help_text, expected)
+
+
+class PostCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counter')
+        cls.group = Group.objects.create(
+            title='Группа со счётчиком',
+            slug='counter-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-counter-slug',
+            description='Тестовое описание',
+        )
+
+    def author_count(self):
+        return AuthorStats.objects.get(user=self.user).posts_count
+
+    def group_count(self, group):
+        group.refresh_from_db()
+        return group.posts_count
+
+    def test_counters_follow_create_edit_delete(self):
+        """Счётчики меняются при создании, переносе и удалении поста."""
+        post = Post.objects.create(
+            author=self.user, text='Пост', group=self.group)
+        Post.objects.create(author=self.user, text='Без группы')
+        self.assertEqual(self.author_count(), 2)
+        self.assertEqual(self.group_count(self.group), 1)
+
+        post.group = self.other_group
+        post.save()
+        self.assertEqual(self.author_count(), 2)
+        self.assertEqual(self.group_count(self.group), 0)
+        self.assertEqual(self.group_count(self.other_group), 1)
+
+        post.delete()
+        self.assertEqual(self.author_count(), 1)
+        self.assertEqual(self.group_count(self.other_group), 0)
+
+    def test_rebuild_command_reports_and_fixes_drift(self):
+        """Команда пересчёта находит и исправляет расхождения."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'bulk{i}', group=self.group)
+            for i in range(3)
+        )
+        out = StringIO()
+        call_command('rebuild_post_counters', '--dry-run', stdout=out)
+        self.assertIn('Найдено расхождений: 2', out.getvalue())
+        self.assertFalse(AuthorStats.objects.filter(user=self.user).exists())
+
+        call_command('rebuild_post_counters', stdout=StringIO())
+        self.assertEqual(self.author_count(), 3)
+        self.assertEqual(self.group_count(self.group), 3)
+        out = StringIO()
+        call_command('rebuild_post_counters', stdout=out)
+        self.assertIn('Расхождений нет', out.getvalue())
+
+
+class FeedIndexesTest(TestCase):
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def test_feeds_use_composite_indexes(self):
+        """Запросы лент идут по составным индексам без сортировки."""
+        user = User.objects.create_user(username='indexed')
+        group = Group.objects.create(
+            title='Группа', slug='indexed', description='-')
+        querysets = {
+            'post_feed_idx': Post.objects.for_feed()[:10],
+            'post_author_feed_idx': user.posts.for_feed()[:10],
+            'post_group_feed_idx': group.posts.for_feed()[:10],
+        }
+        for index, queryset in querysets.items():
+            with self.subTest(index=index):
+                plan = self.explain(queryset)
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
@@ -1,10 +1,30 @@
 # deals/tests/test_views.py
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import OperationalError, connection, connections
 from django.urls import reverse
+from django.utils.http import http_date
 from django import forms
 
+from core import metrics
+from core.slow_queries import query_shape, read_log
+from core.middleware import QueryBudgetExceeded
+from ..counters import post_views
 from ..models import Post, Group
+from ..paginators import encode_cursor, page_window
 
 User = get_user_model()
 
@@ -31,6 +51,7 @@ class PostPagesTests(TestCase):
         )
 
     def setUp(self) -> None:
+        cache.clear()
         self.guest = Client()
         self.user = User.objects.create_user(username='Persona')
         self.user_logined = Client()
@@ -176,3 +197,870 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len((self.author2.get(
                     address + '?page=2')).context['page_obj']),
                     Post.objects.count() - 10, f'{counter} пуста')
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='CursorMan')
+        cls.client_user = Client()
+        cls.group = Group.objects.create(
+            title='Курсорная группа',
+            slug='cursor-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'cursor{i}', group=cls.group)
+            for i in range(25)
+        )
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True))
+        cls.addresses = (
+            reverse('posts:index_p'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user}),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_walk_feed_with_after_cursor(self):
+        """Проход по ленте через ?after= отдаёт все посты по порядку."""
+        for address in self.addresses:
+            with self.subTest(address=address):
+                seen = []
+                with self.settings(POSTS_PAGINATION='cursor'):
+                    page = self.client_user.get(address).context['page_obj']
+                    seen.extend(post.id for post in page)
+                    self.assertFalse(page.has_previous())
+                    while page.has_next():
+                        page = self.client_user.get(
+                            address, {'after': page.next_cursor}
+                        ).context['page_obj']
+                        seen.extend(post.id for post in page)
+                self.assertEqual(seen, self.expected)
+
+    def test_before_cursor_returns_previous_page(self):
+        """?before= возвращает предыдущую страницу."""
+        address = reverse('posts:index_p')
+        with self.settings(POSTS_PAGINATION='cursor'):
+            first = self.client_user.get(address).context['page_obj']
+        second = self.client_user.get(
+            address, {'after': first.next_cursor}).context['page_obj']
+        back = self.client_user.get(
+            address, {'before': second.previous_cursor}).context['page_obj']
+        self.assertEqual(
+            [post.id for post in back], [post.id for post in first])
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_before_newest_post_shows_first_page(self):
+        """?before= от самого нового поста не даёт пустую страницу."""
+        newest = Post.objects.get(pk=self.expected[0])
+        response = self.client_user.get(
+            reverse('posts:index_p'), {'before': encode_cursor(newest)})
+        page = response.context['page_obj']
+        self.assertEqual([post.id for post in page], self.expected[:10])
+        self.assertTrue(page.has_next())
+        self.assertNotContains(response, 'after=None')
+        with self.assertRaises(TypeError):
+            page.next_page_number()
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный токен курсора показывает первую страницу."""
+        response = self.client_user.get(
+            reverse('posts:index_p'), {'after': '###'})
+        page = response.context['page_obj']
+        self.assertEqual([post.id for post in page], self.expected[:10])
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title='Группа ленты',
+            slug='feed-slug',
+            description='Тестовое описание',
+        )
+        for i in range(10):
+            user = User.objects.create_user(username=f'reader{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'feed-{i}', description='-')
+            Post.objects.create(author=user, text=f'Пост {i}', group=group)
+            Post.objects.create(
+                author=cls.author, text=f'Свой {i}', group=cls.group)
+        cls.post = Post.objects.filter(author=cls.author).first()
+
+    def setUp(self):
+        cache.clear()
+        # Иначе на замер может прийтись сброс просмотров из других тестов
+        post_views.flush()
+        self.guest = Client()
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Ленты не делают отдельных запросов за автором и группой."""
+        addresses = {
+            reverse('posts:index_p'): 2,
+            reverse('posts:group_list', kwargs={'slug': 'feed-slug'}): 3,
+            reverse('posts:profile', kwargs={'username': 'writer'}): 3,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}): 2,
+        }
+        for address, expected in addresses.items():
+            with self.subTest(address=address):
+                with CaptureQueriesContext(connection) as queries:
+                    self.guest.get(address)
+                self.assertEqual(len(queries), expected)
+
+    def test_query_budget_is_enforced(self):
+        """Превышение лимита запросов на view роняет запрос."""
+        budgets = {'posts:index_p': 1}
+        with self.settings(QUERY_BUDGETS=budgets, QUERY_BUDGET_RAISE=True,
+                           QUERY_BUDGET_ENFORCE=True):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.guest.get(reverse('posts:index_p'))
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='cached')
+        cls.group = Group.objects.create(
+            title='Кэшируемая группа',
+            slug='cached-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Соседняя группа',
+            slug='other-cached-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Кэшированный пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def cache_status(self, address):
+        return self.guest.get(address)['X-Page-Cache']
+
+    def test_guest_pages_are_cached(self):
+        """Повторный запрос гостя отдаётся из кэша."""
+        address = reverse('posts:index_p')
+        self.assertEqual(self.cache_status(address), 'MISS')
+        response = self.guest.get(address)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertContains(response, 'Кэшированный пост')
+        self.assertFalse(self.author_client.get(address).has_header(
+            'X-Page-Cache'))
+
+    def test_edit_invalidates_only_affected_pages(self):
+        """Правка поста сбрасывает только затронутые страницы."""
+        index = reverse('posts:index_p')
+        group = reverse('posts:group_list', kwargs={'slug': 'cached-slug'})
+        other = reverse(
+            'posts:group_list', kwargs={'slug': 'other-cached-slug'})
+        untouched = reverse('posts:profile', kwargs={'username': 'nobody'})
+        User.objects.create_user(username='nobody')
+        for address in (index, group, other, untouched):
+            self.guest.get(address)
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Новый текст', 'group': self.group.id},
+        )
+        self.assertEqual(self.cache_status(index), 'MISS')
+        self.assertEqual(self.cache_status(group), 'MISS')
+        self.assertEqual(self.cache_status(other), 'HIT')
+        self.assertEqual(self.cache_status(untouched), 'HIT')
+        self.assertContains(self.guest.get(group), 'Новый текст')
+
+    def test_moving_post_invalidates_old_group(self):
+        """Перенос поста сбрасывает страницы старой и новой группы."""
+        group = reverse('posts:group_list', kwargs={'slug': 'cached-slug'})
+        self.guest.get(group)
+        self.post.group = self.other_group
+        self.post.save()
+        response = self.guest.get(group)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertNotContains(response, 'Кэшированный пост')
+
+    def test_group_change_invalidates_author_and_post_pages(self):
+        """Переименование и удаление группы сбрасывают страницы постов."""
+        profile = reverse('posts:profile', args=['cached'])
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        for address in (profile, detail):
+            self.guest.get(address)
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.slug = 'renamed-slug'
+        group.save()
+        response = self.guest.get(profile)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, '/group/renamed-slug/')
+        self.assertEqual(self.cache_status(detail), 'MISS')
+        group.delete()
+        for address in (profile, detail):
+            self.assertEqual(self.cache_status(address), 'MISS')
+        self.assertNotContains(self.guest.get(profile), '/group/renamed-slug/')
+
+    def test_stats_command(self):
+        """Команда выводит статистику попаданий кэша."""
+        address = reverse('posts:index_p')
+        self.guest.get(address)
+        self.guest.get(address)
+        out = StringIO()
+        call_command('page_cache_stats', stdout=out)
+        self.assertIn('Попаданий: 1, промахов: 1', out.getvalue())
+        # В тестах общий кэш — память процесса, о чём команда предупреждает
+        self.assertIn('/metrics', out.getvalue())
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='searcher')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Ёжик в тумане ищет лошадку')
+        Post.objects.create(author=cls.author, text='Лошадка, лошадка!')
+        Post.objects.create(author=cls.author, text='Совсем про другое')
+
+    def setUp(self):
+        self.guest = Client()
+
+    def found(self, query):
+        response = self.guest.get(reverse('posts:search'), {'q': query})
+        return [post.id for post in response.context['page_obj']]
+
+    def test_search_ranks_and_matches_prefix(self):
+        """Поиск находит посты по началу слова и сортирует по релевантности."""
+        found = self.found('лошад')
+        self.assertEqual(len(found), 2)
+        self.assertNotEqual(found[0], self.post.id)
+        self.assertEqual(self.found('ёжик тума'), [self.post.id])
+        self.assertEqual(self.found('"* OR NEAR('), [])
+        self.assertEqual(self.found(''), [])
+
+    def test_index_follows_post_changes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        post = Post.objects.create(author=self.author, text='Зайчик')
+        post.text = 'Медвежонок'
+        post.save()
+        self.assertEqual(self.found('зайчик'), [])
+        self.assertEqual(self.found('медвежонок'), [post.id])
+        post.delete()
+        self.assertEqual(self.found('медвежонок'), [])
+
+    def test_rebuild_command(self):
+        """Команда перестраивает индекс пачками."""
+        out = StringIO()
+        call_command('rebuild_search_index', '--batch-size', '2', stdout=out)
+        self.assertIn('Готово, всего: 3', out.getvalue())
+        self.assertEqual(len(self.found('лошад')), 2)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по полнотекстовому индексу."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.guest.force_login(admin)
+        response = self.guest.get(
+            reverse('admin:posts_post_changelist'), {'q': 'туман'})
+        self.assertEqual(
+            [post.id for post in response.context['cl'].result_list],
+            [self.post.id])
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='timeline')
+        cls.group = Group.objects.create(
+            title='Лента', slug='timeline', description='-')
+        cls.other_group = Group.objects.create(
+            title='Другая лента', slug='other-timeline', description='-')
+        for i in range(15):
+            Post.objects.create(
+                author=cls.author, text=f'Лента {i}', group=cls.group)
+        cls.group_url = reverse(
+            'posts:group_list', kwargs={'slug': 'timeline'})
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+
+    def page_ids(self, address, **params):
+        response = self.guest.get(address, params)
+        return [post.id for post in response.context['page_obj']]
+
+    def expected_ids(self, group):
+        return list(group.posts.values_list('id', flat=True))
+
+    def test_first_pages_come_from_timeline(self):
+        """Первая страница читается по готовому списку id."""
+        with self.settings(PAGE_CACHE_TIMEOUT=0):
+            self.page_ids(self.group_url)
+            with CaptureQueriesContext(connection) as queries:
+                ids = self.page_ids(self.group_url)
+        self.assertEqual(ids, self.expected_ids(self.group)[:10])
+        self.assertEqual(len(queries), 2)
+
+    def test_timeline_is_updated_on_write(self):
+        """Новый и перенесённый пост сразу видны в ленте."""
+        with self.settings(PAGE_CACHE_TIMEOUT=0):
+            self.page_ids(self.group_url)
+            post = Post.objects.create(
+                author=self.author, text='Свежий', group=self.group)
+            self.assertEqual(self.page_ids(self.group_url)[0], post.id)
+            post.group = self.other_group
+            post.save()
+            self.assertNotIn(post.id, self.page_ids(self.group_url))
+            self.assertEqual(
+                self.page_ids(reverse(
+                    'posts:group_list', kwargs={'slug': 'other-timeline'})),
+                [post.id])
+
+    def test_deep_pages_fall_back_to_database(self):
+        """Страницы за пределами ленты читаются из базы."""
+        with self.settings(PAGE_CACHE_TIMEOUT=0, TIMELINE_SIZE=5):
+            first = self.page_ids(self.group_url)
+            second = self.page_ids(self.group_url, page=2)
+            self.assertEqual(
+                self.guest.get(self.group_url).context[
+                    'page_obj'].paginator.count, 15)
+        self.assertEqual(first + second, self.expected_ids(self.group))
+
+
+class CountingPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='counted')
+        for i in range(12):
+            Post.objects.create(author=cls.author, text=f'Счёт {i}')
+        cls.reader = Client()
+        cls.reader.force_login(cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, address):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader.get(address)
+        counts = [q for q in queries if 'COUNT(' in q['sql'].upper()]
+        return response.context['page_obj'].paginator.count, len(counts)
+
+    def test_count_is_cached_until_post_write(self):
+        """COUNT(*) выполняется один раз до следующей записи поста."""
+        address = reverse('posts:index_p')
+        self.assertEqual(self.count_queries(address), (12, 1))
+        self.assertEqual(self.count_queries(address), (12, 0))
+        Post.objects.create(author=self.author, text='Ещё один')
+        self.assertEqual(self.count_queries(address), (13, 1))
+
+    def test_estimate_above_threshold(self):
+        """Свыше порога число берётся по счётчикам, без COUNT(*)."""
+        Post.objects.filter(text='Счёт 0').delete()
+        address = reverse('posts:index_p')
+        with self.settings(PAGINATOR_EXACT_COUNT_LIMIT=5):
+            count, _ = self.count_queries(address)
+        # Удалённый пост не оставляет пустой хвост у ленты
+        self.assertEqual(count, Post.objects.count())
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='etag')
+        cls.group = Group.objects.create(
+            title='Валидаторы', slug='etag', description='-')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Неизменный пост', group=cls.group)
+        cls.addresses = (
+            reverse('posts:index_p'),
+            reverse('posts:group_list', kwargs={'slug': 'etag'}),
+            reverse('posts:profile', kwargs={'username': 'etag'}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.id}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+
+    def test_unchanged_pages_answer_not_modified(self):
+        """Неизменная страница отвечает 304 без отрисовки шаблона."""
+        for address in self.addresses:
+            with self.subTest(address=address):
+                etag = self.guest.get(address)['ETag']
+                response = self.guest.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+        other_page = self.guest.get(
+            self.addresses[0], {'page': 2},
+            HTTP_IF_NONE_MATCH=self.guest.get(self.addresses[0])['ETag'])
+        self.assertEqual(other_page.status_code, 200)
+
+    def test_post_edit_changes_validators(self):
+        """После правки поста валидаторы перестают совпадать."""
+        etags = {address: self.guest.get(address)['ETag']
+                 for address in self.addresses}
+        self.post.text = 'Изменённый пост'
+        self.post.save()
+        for address, etag in etags.items():
+            with self.subTest(address=address):
+                response = self.guest.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_ignores_if_modified_since(self):
+        """Страница поста не отвечает 304 только по дате изменения."""
+        address = self.addresses[-1]
+        response = self.guest.get(address)
+        self.assertNotIn('Last-Modified', response)
+        Post.objects.create(author=self.author, text='Ещё пост автора')
+        response = self.guest.get(
+            address,
+            HTTP_IF_MODIFIED_SINCE=http_date(self.post.updated.timestamp()))
+        self.assertEqual(response.status_code, 200)
+
+    def test_validators_depend_on_user(self):
+        """Гость и автор получают разные ETag."""
+        author = Client()
+        author.force_login(self.author)
+        address = self.addresses[0]
+        self.assertNotEqual(
+            self.guest.get(address)['ETag'], author.get(address)['ETag'])
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='timed')
+        Post.objects.create(author=cls.user, text='Замеряемый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_header_and_log_line(self):
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index_p'))
+        metrics = {
+            part.split(';')[0]
+            for part in response['Server-Timing'].split(', ')
+        }
+        self.assertEqual(metrics, {'db', 'tpl', 'ctx', 'total'})
+        self.assertIn('queries"', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index_p')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreaterEqual(record['total_ms'], record['tpl_ms'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_measured(self):
+        response = self.client.get(reverse('posts:index_p'))
+        self.assertNotIn('Server-Timing', response)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='measured')
+        Post.objects.create(author=cls.user, text='Пост для метрик')
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.guest = Client()
+        self.collector = Client(HTTP_AUTHORIZATION='Bearer secret')
+
+    def test_views_are_counted(self):
+        self.guest.get(reverse('posts:index_p'))
+        self.guest.get(reverse('posts:index_p'))
+        self.guest.get(reverse('about:author'))
+        body = self.collector.get('/metrics').content.decode()
+        self.assertIn(
+            'yatube_http_requests_total{method="GET",status="200",'
+            'view="posts:index_p"} 2', body)
+        self.assertIn('view="about:author"', body)
+        self.assertIn(
+            'yatube_http_request_duration_seconds_count'
+            '{view="posts:index_p"} 2', body)
+        self.assertIn(
+            'yatube_db_queries_per_request_bucket'
+            '{view="posts:index_p",le="+Inf"} 2', body)
+        self.assertIn('yatube_http_response_size_bytes_sum', body)
+        # Первый запрос собрал страницу, второй взял её из кэша
+        self.assertIn(
+            'yatube_page_cache_hit_ratio{view="posts:index_p"} 0.5000', body)
+        # Сама страница метрик не учитывается
+        self.assertNotIn('view="metrics"', body)
+
+    def test_metrics_are_not_public(self):
+        # Запрос через локальный прокси приходит с 127.0.0.1
+        response = self.guest.get('/metrics', REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+        response = self.guest.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        with self.settings(METRICS_TOKEN=''):
+            response = self.guest.get('/metrics', HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 403)
+
+    def test_allowed_ips_are_opt_in(self):
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            response = self.guest.get('/metrics', REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, 200)
+
+    def test_shared_files_are_merged(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # Снимок «другого процесса»
+        other = metrics.Registry()
+        other.inc('yatube_http_requests_total', {
+            'view': 'posts:index_p', 'method': 'GET', 'status': 200})
+        other.flush(directory)
+        os.replace(os.path.join(directory, f'{os.getpid()}.json'),
+                   os.path.join(directory, 'other.json'))
+        with self.settings(METRICS_MULTIPROCESS_DIR=directory):
+            self.guest.get(reverse('posts:index_p'))
+            body = self.collector.get('/metrics').content.decode()
+        self.assertIn(
+            'yatube_http_requests_total{method="GET",status="200",'
+            'view="posts:index_p"} 2', body)
+
+
+class ProfilerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='regular')
+        Post.objects.create(author=cls.user, text='Профилируемый пост')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = self.settings(PROFILER_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = Client()
+
+    def test_staff_gets_stored_report(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('posts:index_p') + '?_profile=1')
+        self.assertEqual(response.status_code, 200)
+        report_url = response['X-Profile-Report']
+        report = b''.join(self.client.get(report_url)).decode()
+        self.assertIn('== cProfile', report)
+        self.assertIn('FROM "posts_post"', report)
+        # Под каждым SELECT — план запроса
+        self.assertRegex(report, r'\n    (SCAN|SEARCH) ')
+        self.assertIn('== tracemalloc', report)
+        self.assertEqual(
+            len([name for name in os.listdir(self.directory)
+                 if name.endswith('.prof')]), 1)
+        listing = self.client.get(reverse('profile_reports'))
+        self.assertContains(listing, report_url.rsplit('/', 1)[-1])
+
+    def test_admin_changelist_is_profiled(self):
+        self.client.force_login(User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='-'))
+        response = self.client.get('/admin/posts/post/?_profile=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Profile-Report', response)
+
+    def test_flag_is_ignored_for_regular_users(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:index_p') + '?_profile=1')
+        self.assertNotIn('X-Profile-Report', response)
+        self.assertEqual(os.listdir(self.directory), [])
+        response = self.client.get(reverse('profile_reports'))
+        self.assertEqual(response.status_code, 302)
+
+
+class SlowQueryLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='slow')
+        Post.objects.create(author=cls.author, text='Медленный пост')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        override = self.settings(
+            SLOW_QUERY_THRESHOLD_MS=0,
+            SLOW_QUERY_LOG_FILE=os.path.join(directory, 'slow.log'))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_foreign_handlers_are_kept(self):
+        # Обработчик мог подключить LOGGING: у него нет baseFilename
+        logger = logging.getLogger('core.slow_queries')
+        extra = logging.StreamHandler(StringIO())
+        logger.addHandler(extra)
+        self.addCleanup(logger.removeHandler, extra)
+        self.client.get(reverse('posts:profile', args=['slow']))
+        self.assertIn(extra, logger.handlers)
+        self.assertTrue(read_log())
+        self.assertIn('posts:profile', extra.stream.getvalue())
+
+    def test_queries_are_logged_with_origin_and_plan(self):
+        self.client.get(reverse('posts:profile', args=['slow']))
+        entries = [
+            entry for entry in read_log()
+            if entry['view'] == 'posts:profile'
+        ]
+        self.assertTrue(entries)
+        lookup = next(
+            entry for entry in entries
+            if entry['sql'].startswith('SELECT') and 'auth_user' in
+            entry['sql'].split('FROM')[1])
+        self.assertEqual(lookup['origin'], 'posts/views.py:profile')
+        self.assertEqual(lookup['params'], ['slow'])
+        self.assertTrue(lookup['plan'])
+        # EXPLAIN не попадает в журнал сам
+        self.assertFalse(any(
+            entry['sql'].startswith('EXPLAIN') for entry in read_log()))
+
+    def test_staff_page_groups_shapes(self):
+        for _ in range(2):
+            # Без кэша страниц оба запроса доходят до базы
+            cache.clear()
+            self.client.get(reverse('posts:profile', args=['slow']))
+        staff = User.objects.create_user(username='dba', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('slow_queries'))
+        self.assertEqual(response.status_code, 200)
+        shapes = response.context['shapes']
+        self.assertTrue(shapes)
+        totals = [item['total_ms'] for item in shapes]
+        self.assertEqual(totals, sorted(totals, reverse=True))
+        self.assertGreaterEqual(max(item['count'] for item in shapes), 2)
+
+    def test_shape_drops_values(self):
+        self.assertEqual(
+            query_shape("SELECT * FROM t WHERE id IN (%s, %s) AND a = 'x'"),
+            query_shape("SELECT * FROM t WHERE id IN (%s) AND a = 'y'"),
+        )
+
+
+class ReplicaRouterTest(TestCase):
+    """Основная база — тестовая, реплика — её копия в отдельном файле."""
+
+    REPLICATED = (
+        'auth_user', 'posts_group', 'posts_post', 'posts_authorstats')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='replicated')
+        Post.objects.create(author=cls.author, text='Есть на реплике')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        connections.databases['replica'] = dict(
+            connection.settings_dict,
+            NAME=os.path.join(directory, 'replica.sqlite3'))
+        self.addCleanup(connections.databases.pop, 'replica')
+        replica = connections['replica']
+        self.addCleanup(delattr, connections._connections, 'replica')
+        self.addCleanup(replica.close)
+        # Снимок основной базы: то, что реплика успела получить
+        with connection.cursor() as source, replica.cursor() as target:
+            for table in self.REPLICATED:
+                source.execute(
+                    'SELECT sql FROM sqlite_master WHERE name = %s', [table])
+                target.execute(source.fetchone()[0])
+                source.execute(f'SELECT * FROM {table}')
+                rows = source.fetchall()
+                if rows:
+                    marks = ', '.join(['%s'] * len(rows[0]))
+                    target.executemany(
+                        f'INSERT INTO {table} VALUES ({marks})', rows)
+        override = self.settings(DATABASE_REPLICAS=['replica'])
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client.force_login(self.author)
+
+    def texts(self, response):
+        return [post.text for post in response.context['page_obj']]
+
+    def test_feeds_read_from_replica_and_writes_pin_to_primary(self):
+        profile = reverse('posts:profile', args=['replicated'])
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Только что написан'})
+        self.assertIn('db_pin', response.cookies)
+        self.assertEqual(Post.objects.count(), 2)
+        # Сразу после записи автор видит свой пост
+        self.assertIn('Только что написан', self.texts(
+            self.client.get(profile)))
+        # Без закрепления лента читается с реплики, где поста ещё нет
+        self.client.cookies.pop('db_pin')
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(profile)
+        self.assertEqual(self.texts(response), ['Есть на реплике'])
+        self.assertNotIn('db_pin', response.cookies)
+        # Сессия всё равно читается с основной базы
+        self.assertFalse(any('django_session' in query['sql']
+                             for query in replica))
+
+    def test_cached_pages_are_built_from_primary(self):
+        Post.objects.create(author=self.author, text='Реплика отстаёт')
+        guest = Client()
+        profile = reverse('posts:profile', args=['replicated'])
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = guest.get(profile)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertIn('Реплика отстаёт', self.texts(response))
+        self.assertEqual(len(replica), 0)
+        response = guest.get(profile)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertContains(response, 'Реплика отстаёт')
+
+    def test_other_views_read_from_primary(self):
+        Post.objects.create(author=self.author, text='Не на реплике')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'реплике'})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+
+class PageWindowTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='prolific')
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}') for i in range(250))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_window(self):
+        self.assertEqual(page_window(1, 1), [1])
+        self.assertEqual(page_window(1, 10), [1, 2, 3, None, 10])
+        self.assertEqual(page_window(4, 10), [1, 2, 3, 4, 5, 6, None, 10])
+        self.assertEqual(
+            page_window(50, 20000),
+            [1, None, 48, 49, 50, 51, 52, None, 20000])
+
+    def test_feed_links_only_window(self):
+        response = self.client.get(reverse('posts:index_p'), {'page': 12})
+        content = response.content.decode()
+        for page in (1, 10, 11, 13, 14, 25):
+            self.assertIn(f'?page={page}"', content)
+        for page in (2, 9, 15, 24):
+            self.assertNotIn(f'?page={page}"', content)
+        self.assertEqual(content.count('&hellip;'), 2)
+
+
+class ViewCounterTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='popular')
+        cls.post = Post.objects.create(author=cls.author, text='Читаемый')
+        cls.other = Post.objects.create(author=cls.author, text='Второй')
+
+    def setUp(self):
+        cache.clear()
+        # Очередь могла остаться от других тестов с теми же id постов
+        post_views.flush()
+        Post.objects.update(views_count=0)
+
+    def views(self, post):
+        return Post.objects.values_list(
+            'views_count', flat=True).get(pk=post.pk)
+
+    def test_views_are_written_in_one_update(self):
+        for post in (self.post, self.post, self.other):
+            post_views.record(post.pk)
+        self.assertEqual(self.views(self.post), 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(post_views.flush(), 2)
+        updates = [query['sql'] for query in queries
+                   if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('CASE', updates[0])
+        self.assertEqual(self.views(self.post), 2)
+        self.assertEqual(self.views(self.other), 1)
+
+    @override_settings(VIEW_COUNT_FLUSH_EVENTS=3)
+    def test_cached_detail_views_are_counted(self):
+        address = reverse('posts:post_detail', args=[self.post.pk])
+        for _ in range(3):
+            response = self.client.get(address)
+        # Последний ответ пришёл из кэша страниц, но просмотр учтён
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertEqual(self.views(self.post), 3)
+        cache.clear()
+        response = self.client.get(reverse('posts:index_p'))
+        self.assertContains(response, 'Просмотров: 3')
+
+    def test_flush_changes_post_validators(self):
+        address = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.client.get(address)['ETag']
+        for _ in range(21):
+            post_views.record(self.post.pk)
+        post_views.flush()
+        response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # 21 просмотр плюс первый запрос страницы
+        self.assertContains(response, 'Просмотров: 22')
+
+    def test_feed_etag_expires_with_page_cache(self):
+        address = reverse('posts:index_p')
+        etag = self.client.get(address)['ETag']
+        later = time.time() + settings.PAGE_CACHE_TIMEOUT
+        with mock.patch('posts.conditional.time.time', return_value=later):
+            response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_failed_flush_keeps_views(self):
+        post_views.record(self.post.pk)
+        error = OperationalError('disk I/O error')
+        with mock.patch('posts.counters.add_post_views',
+                        side_effect=error):
+            with self.assertLogs('posts.counters', 'ERROR'):
+                self.assertEqual(post_views.flush(), 0)
+        post_views.record(self.post.pk)
+        post_views.flush()
+        self.assertEqual(self.views(self.post), 2)
+
+    def test_paused_counter_skips_views(self):
+        address = reverse('posts:post_detail', args=[self.post.pk])
+        with post_views.paused():
+            self.client.get(address)
+            post_views.record(self.other.pk)
+        self.client.get(address)
+        post_views.flush()
+        self.assertEqual(self.views(self.post), 1)
+        self.assertEqual(self.views(self.other), 0)
+
+    def test_edit_keeps_views(self):
+        Post.objects.filter(pk=self.post.pk).update(views_count=7)
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse('posts:post_edit', args=[self.post.pk]),
+            {'text': 'Исправленный'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text, 'Исправленный')
+        self.assertEqual(self.post.views_count, 7)
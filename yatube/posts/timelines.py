@@ -0,0 +1,82 @@
+# posts/timelines.py
+from django.conf import settings
+from django.db import transaction
+
+from .cache import bump_scopes, get_or_build, scope_version
+
+TIMELINE_KEY = 'posts:timeline:{}'
+
+
+def _tag(scope):
+    # Общая версия позволяет разом сбросить все ленты после массовой
+    # загрузки постов в обход сигналов; своя — после записи в ленту
+    return f"{scope_version('timelines')}:{scope_version(f'timeline:{scope}')}"
+
+
+def reset_timelines():
+    bump_scopes(['timelines'])
+
+
+def get_timeline(scope, queryset):
+    """Список (pub_date, id) последних постов ленты, новые первыми.
+
+    При промахе строится одним запросом по индексу ленты.
+    """
+    def build():
+        return [
+            (pub_date.timestamp(), pk)
+            for pub_date, pk in queryset.values_list(
+                'pub_date', 'id')[:settings.TIMELINE_SIZE]
+        ]
+    return get_or_build(TIMELINE_KEY.format(scope), build,
+                        settings.TIMELINE_TIMEOUT, _tag(scope))
+
+
+def invalidate_timelines(scopes):
+    """Сбрасывает ленты, в которые записали пост.
+
+    Правка списка в кэше (прочитать, изменить, записать) теряла бы
+    одновременные изменения из разных процессов, поэтому ленту
+    пересобираем одним запросом по индексу. Версию меняем и после
+    коммита: иначе читатель мог собрать ленту по данным до записи
+    уже под новой версией.
+    """
+    scopes = [f'timeline:{scope}' for scope in scopes]
+    bump_scopes(scopes)
+    transaction.on_commit(lambda: bump_scopes(scopes))
+
+
+class TimelineFeed:
+    """Лента для Paginator: первые страницы берутся по готовым id.
+
+    Срез, попадающий в сохранённую ленту, читается запросом
+    ``id IN (...)``; более глубокие страницы идут в базу как обычно.
+    """
+
+    def __init__(self, scope, queryset):
+        self.queryset = queryset
+        self.timeline = get_timeline(scope, queryset)
+
+    @property
+    def complete(self):
+        # Неполная лента содержит все посты, и считать их не нужно
+        return len(self.timeline) < settings.TIMELINE_SIZE
+
+    def count(self):
+        if self.complete:
+            return len(self.timeline)
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        stop = item.stop
+        if not self.complete and (stop is None or stop > len(self.timeline)):
+            return list(self.queryset[item])
+        ids = [pk for _, pk in self.timeline[start:stop]]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
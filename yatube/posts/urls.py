@@ -1,7 +1,7 @@
 # posts/urls.py
 from django.urls import path
 
-from . import views
+from . import api, views
 app_name = 'posts'
 urlpatterns = [
     path('', views.index, name="index_p"),
@@ -11,5 +11,13 @@ urlpatterns = [
     # Просмотр записи
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name="post_create"),
+    # Полнотекстовый поиск по постам
+    path('search/', views.search, name='search'),
+    # JSON API для мобильных клиентов
+    path('api/posts/', api.index, name='api_index'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_list'),
+    path('api/profile/<str:username>/', api.profile, name='api_profile'),
+    path('api/posts/<int:post_id>/', api.post_detail,
+         name='api_post_detail'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
 ]
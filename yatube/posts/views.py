@@ -1,36 +1,74 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect
 
+from core.sqlite import retry_on_lock
+from .cache import cache_anonymous_page
+from .counters import count_post_view
+from .conditional import feed_etag, post_etag
 from .models import Post, Group, User
 from .forms import PostForm
+from .paginators import (CountingPaginator, CursorPaginator,
+                         estimate_post_count)
+from .search import SearchResults
+from .timelines import TimelineFeed
 
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import render
+from django.views.decorators.http import condition
 
 POSTS_ON_PAGE = 10
-
-
-def get_page(request, post_list):
-    paginator = Paginator(post_list, POSTS_ON_PAGE)
+EDITABLE_POST_FIELDS = [
+    field.name for field in Post._meta.concrete_fields
+    if not field.primary_key and field.name != 'views_count'
+]
+
+
+def get_page(request, post_list, timeline=None, count_scope=None,
+             estimate=None):
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    # Курсорный режим включается настройкой или токеном в адресе
+    if (after or before
+            or settings.POSTS_PAGINATION == 'cursor'):
+        paginator = CursorPaginator(post_list, POSTS_ON_PAGE)
+        return paginator.get_cursor_page(after=after, before=before)
+    if timeline is not None:
+        # Первые страницы ленты группы или автора берём из готового списка
+        post_list = TimelineFeed(timeline, post_list)
+    paginator = CountingPaginator(
+        post_list, POSTS_ON_PAGE, count_scope=count_scope, estimate=estimate)
     page_number = request.GET.get('page')
     return paginator.get_page(page_number)
 
 
+@condition(etag_func=feed_etag('index'))
+@cache_anonymous_page('index')
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.all()
-    page_obj = get_page(request, post_list)
+    post_list = Post.objects.for_feed()
+    page_obj = get_page(
+        request, post_list, count_scope='index',
+        estimate=estimate_post_count)
     context = {
         'page_obj': page_obj,
     }
     return render(request, template, context)
 
 
+@condition(etag_func=feed_etag('group:{slug}'))
+@cache_anonymous_page('group:{slug}')
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = get_page(request, post_list)
+    post_list = group.posts.for_feed()
+    page_obj = get_page(
+        request, post_list, f'group:{group.pk}',
+        count_scope=f'group:{slug}',
+        estimate=lambda: group.posts_count)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -38,11 +76,17 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@condition(etag_func=feed_etag('author:{username}'))
+@cache_anonymous_page('author:{username}')
 def profile(request, username):
     template = 'posts/profile.html'
-    user = get_object_or_404(User, username=username)
-    post_list = user.posts.all()
-    page_obj = get_page(request, post_list)
+    user = get_object_or_404(
+        User.objects.select_related('post_stats'), username=username)
+    post_list = user.posts.for_feed()
+    page_obj = get_page(
+        request, post_list, f'author:{user.pk}',
+        count_scope=f'author:{username}',
+        estimate=lambda: user.post_stats.posts_count)
     context = {
         'author': user,
         'page_obj': page_obj,
@@ -50,24 +94,67 @@ def profile(request, username):
     return render(request, template, context)
 
 
+@count_post_view
+@condition(etag_func=post_etag)
+@cache_anonymous_page('post:{post_id}')
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__post_stats'),
+        id=post_id)
     context = {
         'post': post,
     }
     return render(request, template, context)
 
 
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), POSTS_ON_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'extra_query': urlencode({'q': query}) + '&' if query else '',
+    }
+    return render(request, template, context)
+
+
+def save_post(form, author=None):
+    """Сохраняет пост вместе со счётчиками одной транзакцией.
+
+    Если база занята другим писателем, транзакция повторяется.
+    """
+    # Новый это пост или правка, решаем до первой попытки: после отката
+    # вставки у поста остаётся pk, и повтор принял бы его за правку
+    return _write_post(form, author, form.instance._state.adding)
+
+
+@retry_on_lock
+def _write_post(form, author, adding):
+    with transaction.atomic():
+        post = form.save(commit=False)
+        if author is not None:
+            post.author = author
+        if adding:
+            post.pk = None
+            post._state.adding = True
+            post.save()
+        else:
+            # Просмотры пишет только ViewCounter: сохранение всех полей
+            # затёрло бы их значением, прочитанным до правки
+            post.save(update_fields=EDITABLE_POST_FIELDS)
+    return post
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(request.POST or None)
     if request.method == 'POST':
         if form.is_valid():
-            post = form.save(commit=False)
-            post.author = request.user
-            post.save()
+            post = save_post(form, author=request.user)
             return redirect('posts:profile', post.author)
         return render(request, template, {'form': form})
     return render(request, template, {'form': form})
@@ -81,7 +168,7 @@ def post_edit(request, post_id):
         return redirect('posts:post_detail', post.id)
     form = PostForm(request.POST or None, instance=post,)
     if form.is_valid():
-        form.save()
+        save_post(form)
         return redirect('posts:post_detail', post.id)
     return render(
         request,
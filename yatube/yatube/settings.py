@@ -59,6 +59,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,16 +67,34 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Боевой режим шаблонов: кэширующий загрузчик и компиляция всех шаблонов
+# проекта при старте процесса (CoreConfig.ready), а не на первом запросе.
+# Сравнить режимы — manage.py bench_templates
+TEMPLATES_CACHED = os.getenv('TEMPLATES_CACHED', '0' if DEBUG else '1') == '1'
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Стандартный бэкенд, который ещё и замеряет время рендеринга
+        'BACKEND': 'core.template_backend.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': (
+                [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+                if TEMPLATES_CACHED else TEMPLATE_LOADERS
+            ),
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -100,6 +119,31 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: пути к копиям базы через запятую.
+# Их наполняет внешняя репликация, миграции на них не запускаются
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+# Какие view читают с реплик и на сколько секунд после записи
+# пользователь читает только с основной базы
+REPLICA_VIEWS = (
+    'posts:index_p',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+)
+REPLICA_PIN_SECONDS = 10
+# Приложения, чьи модели можно читать с реплик
+REPLICA_APPS = ('posts', 'auth')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -139,3 +183,136 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+# Режим пагинации лент: 'page' (номера страниц) или 'cursor' (?after=/?before=)
+POSTS_PAGINATION = os.getenv('POSTS_PAGINATION', 'page')
+
+# Лимиты SQL-запросов на одну view; превышение означает N+1 в шаблоне
+QUERY_BUDGET_ENFORCE = DEBUG
+QUERY_BUDGET_RAISE = DEBUG
+QUERY_BUDGETS = {
+    'posts:index_p': 8,
+    'posts:group_list': 8,
+    'posts:profile': 8,
+    'posts:post_detail': 6,
+    'posts:search': 8,
+}
+
+# Сколько секунд хранить готовые страницы лент для гостей (0 — не хранить)
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Сколько последних id постов хранить в ленте группы и автора
+TIMELINE_SIZE = 200
+TIMELINE_TIMEOUT = 60 * 60 * 24
+
+# Число постов в ленте кэшируется; свыше лимита вместо COUNT(*) — оценка
+PAGINATOR_COUNT_TIMEOUT = 60 * 5
+PAGINATOR_EXACT_COUNT_LIMIT = 10000
+
+# Размер страницы JSON API по умолчанию и максимальный (?limit=)
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 1000
+
+# Доля запросов, для которых считаются Server-Timing и строка в логе
+# core.timing; в проде небольшая, чтобы замеры почти ничего не стоили
+SERVER_TIMING_SAMPLE_RATE = float(
+    os.getenv('SERVER_TIMING_SAMPLE_RATE', 1.0 if DEBUG else 0.01))
+
+# Метрики для /metrics: какие приложения учитывать и кому их отдавать.
+# По умолчанию страница открыта только персоналу. Сборщику метрик нужен
+# токен (заголовок Authorization: Bearer <METRICS_TOKEN>) или явный список
+# адресов через запятую. Локальные адреса по умолчанию не доверены: за
+# прокси на той же машине 127.0.0.1 — адрес любого посетителя.
+# В режиме нескольких процессов снимки пишутся в общий каталог
+METRICS_ENABLED = True
+METRICS_NAMESPACES = ('posts', 'users', 'about')
+METRICS_ALLOWED_IPS = list(
+    filter(None, os.getenv('METRICS_ALLOWED_IPS', '').split(',')))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_MULTIPROCESS_DIR = os.getenv('METRICS_MULTIPROCESS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+
+# Профилирование одного запроса персонала: ?_profile=1 в любом адресе.
+# Отчёты (cProfile, SQL с планами, tracemalloc) лежат в PROFILER_DIR
+PROFILER_PARAM = '_profile'
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILER_TOP = 30
+
+# Журнал медленных запросов (JSON-строки с планом и местом в коде);
+# None выключает журнал
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_LOG_FILE = os.path.join(BASE_DIR, 'logs', 'slow_queries.log')
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Боевой режим SQLite: прагмы на каждом соединении и повтор записи,
+# если база занята. Обслуживание — manage.py sqlite_maintenance
+SQLITE_PRODUCTION = os.getenv('SQLITE_PRODUCTION', '0') == '1'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в килобайтах
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+}
+SQLITE_LOCK_RETRIES = 5
+SQLITE_LOCK_BACKOFF = 0.05
+
+# Просмотры постов копятся в памяти процесса и пишутся в базу одним
+# UPDATE раз в VIEW_COUNT_FLUSH_INTERVAL секунд или каждые N просмотров
+VIEW_COUNT_FLUSH_INTERVAL = 5
+VIEW_COUNT_FLUSH_EVENTS = 100
+
+# Двухуровневый кэш: LRU в памяти процесса перед общим кэшем.
+# Общий уровень — каталог CACHE_DIR, если он задан; без него (в разработке
+# и тестах) — память процесса, чтобы разные базы не делили один кэш.
+# У файлового кэша add() и incr() не атомарны, см. core.cache_backends
+SHARED_CACHE_DIR = os.getenv('CACHE_DIR')
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'yatube',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_ENTRIES': 2000,
+            'LOCAL_TIMEOUT': 5,
+            'STALE_TIMEOUT': 60,
+            'LOCK_TIMEOUT': 30,
+            'LOCK_WAIT': 5,
+        },
+    },
+    'shared': {
+        'BACKEND': (
+            'django.core.cache.backends.filebased.FileBasedCache'
+            if SHARED_CACHE_DIR else
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': SHARED_CACHE_DIR or 'yatube-shared',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # В разработке замеры видны в заголовке, лог нужен в проде
+        'core.timing': {
+            'handlers': ['console'],
+            'level': 'WARNING' if DEBUG else 'INFO',
+            'propagate': False,
+        },
+        'core.template_backend': {
+            'handlers': ['console'],
+            'level': 'WARNING' if DEBUG else 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -16,11 +16,20 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import (metrics, profile_report, profile_reports,
+                        slow_queries)
+
 urlpatterns = [
     path('', include('posts.urls', namespace="posts")),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
-
+    # Метрики для Prometheus
+    path('metrics', metrics, name='metrics'),
+    # Отчёты профилировщика для персонала
+    path('debug/profiles/', profile_reports, name='profile_reports'),
+    path('debug/profiles/<str:name>', profile_report, name='profile_report'),
+    # Сводка медленных запросов для персонала
+    path('debug/slow-queries/', slow_queries, name='slow_queries'),
 ]